@@ -1,9 +1,42 @@
 from random import randint, randrange
+from math import gcd, prod
+from concurrent.futures import ProcessPoolExecutor
 import hashlib
+import random
+
+# odd primes below 2000, used to discard most candidates before Miller-Rabin
+def smallPrimes(limit: int) -> list[int]:
+	sieve = bytearray([1]) * limit
+	sieve[0:2] = b'\x00\x00'
+	for i in range(2, int(limit ** 0.5) + 1):
+		if sieve[i]:
+			sieve[i*i::i] = bytearray(len(sieve[i*i::i]))
+	return [i for i in range(3, limit) if sieve[i]]
+
+SMALL_PRIMES = smallPrimes(2000)
+SMALL_PRIMES_PRODUCT = prod(SMALL_PRIMES)
+
+# prime search run in a worker process by genKeypair(parallel=True)
+def _primeWorker(bits: int) -> int:
+	# forked workers inherit the parent's random state; without reseeding p == q
+	random.seed()
+	return RSA.__new__(RSA).getPrime(bits)
 
 class RSA():
-	def __init__(self, bits: int = 1024) -> None:
-		self.public, self.private = self.genKeypair(bits)
+	def __init__(self, bits: int = 1024, parallel: bool = False) -> None:
+		# CRT parameters (p, q, dP, dQ, qInv), filled in by genKeypair
+		self.crt = None
+		self.public, self.private = self.genKeypair(bits, parallel)
+
+	# build an RSA object around an existing key instead of generating one
+	# usage: RSA.fromComponents(public exponent, private exponent, p, q)
+	@classmethod
+	def fromComponents(cls, e: int, d: int, p: int, q: int) -> "RSA":
+		rsa = cls.__new__(cls)
+		n = p * q
+		rsa.public, rsa.private = (e, n), (d, n)
+		rsa.crt = (p, q, d % (p - 1), d % (q - 1), rsa.modInverse(q, p))
+		return rsa
 
 	# Miller-Rabin https://fr.wikipedia.org/wiki/Test_de_primalit%C3%A9_de_Miller-Rabin
 	# (slightly modified) implementation taken from https://rosettacode.org/wiki/Miller%E2%80%93Rabin_primality_test#Python:_Probably_correct_answers
@@ -17,11 +50,21 @@ class RSA():
 		
 		trials = 8
 
+		if n < 2:
+			return False
+		if n == 2:
+			return True
+		if n % 2 == 0:
+			return False
+
 		def trial_composite(a) -> bool:
-			if pow(a, d, n) == 1:
+			# a^d, then square it up to a^(2^(s-1) * d) instead of recomputing each power
+			x = pow(a, d, n)
+			if x == 1 or x == n - 1:
 				return False
-			for i in range(s):
-				if pow(a, 2 ** i * d, n) == n - 1:
+			for _ in range(s - 1):
+				x = x * x % n
+				if x == n - 1:
 					return False
 			return True
 
@@ -39,15 +82,22 @@ class RSA():
 				return False
 		return True
 
+	# cheap pre-filter: False if n is divisible by a small prime (other than itself)
+	def passesSieve(self, n: int) -> bool:
+		if n <= SMALL_PRIMES[-1]:
+			return n == 2 or (n % 2 == 1 and all(n % sp for sp in SMALL_PRIMES if sp < n))
+		return n % 2 == 1 and gcd(n, SMALL_PRIMES_PRODUCT) == 1
+
 	# generate random prime number between a and b
 	def randomPrime(self, a: int, b: int) -> int:
-		p = randint(a, b)
-		while not self.isPrime(p):
-			# according to https://en.wikipedia.org/wiki/Prime_number_theorem
-			# this loop has a p/log(p) chance of being escaped every iteration
-			# significantly faster than using a seive of arithosthenes like I was earlier
+		# according to https://en.wikipedia.org/wiki/Prime_number_theorem
+		# a candidate has a 1/log(p) chance of being prime; even numbers and
+		# multiples of small primes (~88% of candidates) are rejected with a
+		# single gcd before any Miller-Rabin round
+		while True:
 			p = randint(a, b)
-		return p
+			if self.passesSieve(p) and self.isPrime(p):
+				return p
 
 	# generate random prime number of binary length (bits)
 	def getPrime(self, bits: int = 1024) -> int:
@@ -60,11 +110,16 @@ class RSA():
 	# generate public and private (in that order) RSA keypair of a given length.
 	# automatically called upon RSA object initialisation
 	# recommend 1024 bits or more
-	# usage: () or (number of bits)
-	def genKeypair(self, bits: int = 1024) -> tuple[tuple[int, int], tuple[int, int]]:
-		p, q = self.getPrime(bits), self.getPrime(bits)
-		while p == q:
+	# parallel=True searches p and q at the same time in two worker processes
+	# usage: () or (number of bits) or (number of bits, parallel)
+	def genKeypair(self, bits: int = 1024, parallel: bool = False) -> tuple[tuple[int, int], tuple[int, int]]:
+		if parallel:
+			with ProcessPoolExecutor(max_workers=2) as pool:
+				p, q = pool.map(_primeWorker, [bits, bits])
+		else:
 			p, q = self.getPrime(bits), self.getPrime(bits)
+		while p == q:
+			q = self.getPrime(bits)
 		
 		n = p * q
 		phin = (p - 1) * (q - 1)
@@ -74,8 +129,25 @@ class RSA():
 			e = self.randomPrime(orig_e, orig_e * 2)
 		
 		d = self.modInverse(e, phin)
+		self.crt = (p, q, d % (p - 1), d % (q - 1), self.modInverse(q, p))
 		return ((e,n), (d,n))
 
+	# private key operation x^d mod n using the chinese remainder theorem:
+	# two half-size exponentiations instead of one full-size one (~3-4x faster)
+	# usage: (ciphertext or value to sign as int)
+	def privatePow(self, x: int) -> int:
+		e, n = self.public
+		p, q, dP, dQ, qInv = self.crt
+		m1 = pow(x % p, dP, p)
+		m2 = pow(x % q, dQ, q)
+		h = (qInv * (m1 - m2)) % p
+		m = m2 + h * q
+		# a fault in one half would leak p or q (Bellcore attack), so check the
+		# result with the cheap public exponent before releasing it
+		if pow(m, e, n) != x % n:
+			raise ValueError("CRT private key operation failed")
+		return m
+
 	# returns public key of RSA object
 	# usage: ()
 	def getPublicKey(self) -> tuple[int, int]:
@@ -93,8 +165,7 @@ class RSA():
 	# decrypt RSA
 	# usage: receiver.dec(sender's public key, encrypted message)
 	def dec(self, pub, enc_s: tuple[int, int]) -> str:
-		priv_d, n = self.private
-		m_int = pow(enc_s[0], priv_d, n)
+		m_int = self.privatePow(enc_s[0])
 		us = int.to_bytes(m_int, (m_int.bit_length() + 7) // 8, 'big').decode('utf-8')
 		v = self.verify(pub, (m_int, enc_s[1]))
 		assert(v)
@@ -103,10 +174,9 @@ class RSA():
 	# sign message (pre_encryption)
 	# usage: (message to sign)
 	def sign(self, s: int) -> tuple[int, int]:
-		priv_d, n = self.private
 		s_bytes = int.to_bytes(s, (s.bit_length() + 7) // 8, 'big')
 		hash_int = int.from_bytes(hashlib.sha256(s_bytes).digest(), 'big')
-		m = pow(hash_int, priv_d, n)
+		m = self.privatePow(hash_int)
 		return (s, m)
 
 	# verify signature (post-decryption)
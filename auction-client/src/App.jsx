@@ -52,6 +52,22 @@ const decryptAES = (encryptedB64, key) => {
   return JSON.parse(decrypted.toString(CryptoJS.enc.Utf8));
 };
 
+//WS events are sealed once for every client with AES-GCM under a broadcast key (WebCrypto, crypto-js has no GCM)
+const base64ToBytes = (b64) => Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+
+const importEventKey = (keyB64) =>
+  crypto.subtle.importKey('raw', base64ToBytes(keyB64), 'AES-GCM', false, ['decrypt']);
+
+const openEvent = async (message, key) => {
+  const raw = base64ToBytes(message.data);
+  const plaintext = await crypto.subtle.decrypt(
+    { name: 'AES-GCM', iv: raw.slice(0, 12), additionalData: new TextEncoder().encode(`event:${message.epoch}`) },
+    key,
+    raw.slice(12)
+  );
+  return JSON.parse(new TextDecoder().decode(plaintext));
+};
+
 
 const createApiClient = (session) => {
   const request = async (endpoint, method = 'GET', body = null) => {
@@ -487,6 +503,10 @@ export default function AuctionPlatform() {
   const [showAccount, setShowAccount] = useState(false);
   const [session, setSession] = useState(null);
   const ws = useRef(null);
+  const subscribed = useRef(new Set());
+  const auctionsRef = useRef([]);
+  //broadcast keys by epoch; the previous one stays for events already on their way
+  const eventKeys = useRef(new Map());
 
   useEffect(() => {
     const initSession = async () => {
@@ -544,37 +564,82 @@ export default function AuctionPlatform() {
     }
   }, [session]);
 
+  //WS topics: creations + every open lot we display
+  const subscribe = (auctionList) => {
+    if (!ws.current || ws.current.readyState !== WebSocket.OPEN) return;
+    const topics = ['catalogue', ...auctionList.filter(a => a.status === 'open').map(a => a.id)]
+      .filter(t => !subscribed.current.has(t));
+    if (topics.length === 0) return;
+    topics.forEach(t => subscribed.current.add(t));
+    ws.current.send(JSON.stringify({ action: 'subscribe', topics }));
+  };
+
+  useEffect(() => {
+    auctionsRef.current = auctions;
+    subscribe(auctions);
+  }, [auctions]);
+
+  const applyEvent = (message) => {
+    if (message.event === 'NEW_BID') {
+      setAuctions(prev => prev.map(a => {
+        if (a.id === message.id) {
+          return { ...a, highest_bid: message.amount, highest_bidder: message.bidder };
+        }
+        return a;
+      }));
+    } else if (message.event === 'END') {
+      setAuctions(prev => prev.map(a => {
+        if (a.id === message.id) {
+          return { ...a, status: 'closed', time_remaining: 0 };
+        }
+        return a;
+      }));
+    } else if (message.event === 'CREAT') {
+      setAuctions(prev => prev.some(a => a.id === message.id) ? prev : [...prev, message.auction]);
+    }
+  };
+
+  const handleFrame = async (frame) => {
+    if (frame.event === 'KEY') {
+      const { epoch, key } = decryptAES(frame.data, session.key);
+      eventKeys.current.set(epoch, await importEventKey(key));
+      //epochs may skip numbers, keep the last two handed over
+      while (eventKeys.current.size > 2) {
+        eventKeys.current.delete(eventKeys.current.keys().next().value);
+      }
+      return;
+    }
+    const key = eventKeys.current.get(frame.epoch);
+    if (!key) {
+      console.warn("WS event under an unknown key, epoch", frame.epoch);
+      return;
+    }
+    const message = await openEvent(frame, key);
+    console.log("WS Message:", message);
+    applyEvent(message);
+  };
+
   useEffect(() => {
-    ws.current = new WebSocket(WS_URL);
+    if (!session) return;
+    //bound to the session, so events arrive encrypted
+    ws.current = new WebSocket(`${WS_URL}?session_id=${encodeURIComponent(session.id)}`);
+    eventKeys.current = new Map();
+    //frames are handled one at a time, so a KEY is in place before the events sealed under it
+    let frames = Promise.resolve();
 
     ws.current.onopen = () => {
       console.log("WS Connected");
+      subscribed.current = new Set();
+      subscribe(auctionsRef.current);
     };
 
     ws.current.onmessage = (event) => {
-      const message = JSON.parse(event.data);
-      console.log("WS Message:", message);
-
-      if (message.event === 'NEW_BID') {
-        setAuctions(prev => prev.map(a => {
-          if (a.id === message.id) {
-            return { ...a, highest_bid: message.amount, highest_bidder: message.bidder };
-          }
-          return a;
-        }));
-      } else if (message.event === 'END') {
-        setAuctions(prev => prev.map(a => {
-          if (a.id === message.id) {
-            return { ...a, status: 'closed', time_remaining: 0 };
-          }
-          return a;
-        }));
-      } else if (message.event === 'CREAT') {
-        if (api) fetchAuctions();
-      }
+      const frame = JSON.parse(event.data);
+      frames = frames.then(() => handleFrame(frame)).catch(err => console.error("WS event dropped:", err));
     };
 
-    ws.current.onclose = () => console.log("WS Disconnected");
+    //1008: the session was ended or has expired
+    ws.current.onclose = (event) => console.log("WS Disconnected", event.code);
 
     // Timer
     const timer = setInterval(() => {
@@ -590,7 +655,7 @@ export default function AuctionPlatform() {
       if (ws.current) ws.current.close();
       clearInterval(timer);
     };
-  }, [api]);
+  }, [session]);
 
   const handlePlaceBid = async (auctionId, amount) => {
     if (!api) return;
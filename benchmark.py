@@ -0,0 +1,505 @@
+import asyncio
+import base64
+import gc
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from random import randint, randrange
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from Crypto.Util.Padding import pad, unpad
+
+import ciphers
+import payloads
+from RSA import RSA
+from connections import ALL, Connection, ConnectionManager
+from eventbus import EventBus, run_broker
+from passwords import Overloaded, PasswordHasher
+from store import AUCTION_COLUMNS, AuctionStore, SqliteAuctionStore
+
+# --- Helpers ---
+
+def measure(fn, rounds):
+    """Average seconds per call of fn over rounds calls."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+# --- Benchmarks ---
+
+def bench_rsa_private(rounds=50):
+    """Full-width pow(c, d, n) against the CRT path used by /handshake."""
+    print("RSA private key operation (server key is RSA(1024): 2048-bit modulus)")
+    rsa = RSA(1024)
+    (e, n) = rsa.public
+    (d, _) = rsa.private
+    c = randrange(2, n)
+    assert pow(c, d, n) == rsa.privatePow(c)
+
+    plain = measure(lambda: pow(c, d, n), rounds)
+    crt = measure(lambda: rsa.privatePow(c), rounds)
+    print(f"   pow(c, d, n):    {plain * 1000:8.2f} ms")
+    print(f"   privatePow(c):   {crt * 1000:8.2f} ms  ({plain / crt:.1f}x)")
+
+def legacy_get_prime(bits):
+    """Prime search as it was before sieving: random candidates, MR recomputing every power."""
+    def is_prime(n):
+        s, d = 0, n - 1
+        while d % 2 == 0:
+            d >>= 1
+            s += 1
+        for _ in range(8):
+            a = randrange(2, n)
+            if pow(a, d, n) == 1:
+                continue
+            if not any(pow(a, 2 ** i * d, n) == n - 1 for i in range(s)):
+                return False
+        return True
+
+    p = randint(2 ** (bits - 1), 2 ** bits - 1)
+    while not is_prime(p):
+        p = randint(2 ** (bits - 1), 2 ** bits - 1)
+    return p
+
+def bench_keygen():
+    """Key generation for 1024/2048/3072-bit moduli (RSA(bits) draws two primes of bits bits)."""
+    print("RSA key generation (average over rounds, results vary with luck)")
+    print(f"   {'modulus':>8} {'legacy':>10} {'sieve':>10} {'parallel':>10}")
+    for modulus, rounds in ((1024, 5), (2048, 2), (3072, 1)):
+        bits = modulus // 2
+        legacy = measure(lambda: (legacy_get_prime(bits), legacy_get_prime(bits)), rounds)
+        sieve = measure(lambda: RSA(bits), rounds)
+        parallel = measure(lambda: RSA(bits, parallel=True), rounds)
+        print(f"   {modulus:>8} {legacy:>9.2f}s {sieve:>9.2f}s {parallel:>9.2f}s")
+
+class Recorder:
+    """Stands in for a worker's ConnectionManager, records how long each event took to arrive."""
+
+    def __init__(self, expected=0):
+        self.expected = expected
+        self.latencies = []
+        self.done = asyncio.Event()
+
+    def broadcast(self, topic, message, coalesce=False):
+        self.latencies.append(time.monotonic() - message["sent"])
+        if len(self.latencies) == self.expected:
+            self.done.set()
+
+async def connected_bus(manager, path):
+    bus = EventBus(manager, path)
+    await bus.start(timeout=10)
+    return bus
+
+def fanout_worker(path, events, ready, results):
+    async def run():
+        recorder = Recorder(events)
+        bus = await connected_bus(recorder, path)
+        ready.put(True)
+        await recorder.done.wait()
+        await bus.close()
+        results.put(recorder.latencies)
+    asyncio.run(run())
+
+def bench_fanout(events=500):
+    """Time from publish on one worker until the event reached the last of the other workers."""
+    print(f"Event bus fan-out latency ({events} events, one publisher)")
+    print(f"   {'workers':>8} {'p50':>10} {'p99':>10} {'max':>10}")
+    path = os.path.join(tempfile.gettempdir(), f"auction-bench-{os.getpid()}.sock")
+    broker = multiprocessing.Process(target=run_broker, args=(path,), daemon=True)
+    broker.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    try:
+        for workers in (1, 2, 4, 8, 16):
+            ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=fanout_worker, args=(path, events, ready, results))
+                     for _ in range(workers)]
+            for proc in procs:
+                proc.start()
+            for _ in procs:
+                ready.get()
+
+            async def publish():
+                bus = await connected_bus(Recorder(), path)
+                for i in range(events):
+                    bus.publish("a1", {"event": "NEW_BID", "id": "a1", "amount": i, "sent": time.monotonic()})
+                    # paced so the figure is latency, not queueing behind a burst
+                    await asyncio.sleep(0.002)
+                await bus.close()
+            asyncio.run(publish())
+
+            # per event, the slowest worker decides when fan-out is complete
+            received = [results.get() for _ in procs]
+            for proc in procs:
+                proc.join()
+            slowest = sorted(max(per_worker) for per_worker in zip(*received))
+            p50 = slowest[len(slowest) // 2]
+            p99 = slowest[int(len(slowest) * 0.99)]
+            print(f"   {workers:>8} {p50 * 1e6:>8.0f}us {p99 * 1e6:>8.0f}us {slowest[-1] * 1e6:>8.0f}us")
+    finally:
+        broker.terminate()
+        broker.join()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def fake_auctions(count):
+    now = time.time()
+    for i in range(count):
+        # one auction in ten still open
+        yield {"id": f"a{i}", "item": f"item {i}", "description": "", "seller": f"seller{i % 1000}",
+               "highest_bid": 10, "highest_bidder": None, "status": "open" if i % 10 == 0 else "closed",
+               "start_time": now, "end_time": now + 3600, "version": i + 1}
+
+def bench_storage(rounds=200):
+    """Open, get, page and bid costs of data.json vs SQLite as the catalogue grows."""
+    print("Storage backends (json is skipped at 1M: the whole catalogue would sit in memory)")
+    print(f"   {'auctions':>9} {'':>6} {'open':>10} {'get':>10} {'page':>10} {'bid':>10}")
+    for count in (100, 10_000, 100_000, 1_000_000):
+        workdir = tempfile.mkdtemp()
+        try:
+            stores = []
+            if count <= 100_000:
+                path = os.path.join(workdir, "data.json")
+                with open(path, "w") as f:
+                    json.dump({"users": [], "auctions": list(fake_auctions(count)), "seq": count}, f)
+                stores.append(("json", lambda: AuctionStore(path)))
+
+            db_path = os.path.join(workdir, "data.db")
+            SqliteAuctionStore(db_path).close()
+            with sqlite3.connect(db_path) as db:
+                db.executemany(
+                    f"INSERT INTO auctions (position, {', '.join(AUCTION_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(AUCTION_COLUMNS) + 1))})",
+                    ((i,) + tuple(a[c] for c in AUCTION_COLUMNS) for i, a in enumerate(fake_auctions(count)))
+                )
+                db.execute("UPDATE meta SET value = ? WHERE key = 'version'", (count,))
+            stores.append(("sqlite", lambda: SqliteAuctionStore(db_path)))
+
+            for name, open_store in stores:
+                start = time.perf_counter()
+                store = open_store()
+                opened = time.perf_counter() - start
+                ids = [f"a{randrange(0, count, 10)}" for _ in range(rounds)]
+                get = measure(lambda: store.get_auction(ids[randrange(rounds)]), rounds)
+                page = measure(lambda: store.list_auctions(status="open", cursor=randrange(count), limit=50), rounds)
+                amounts = iter(range(11, 11 + rounds))
+                bid = measure(lambda: store.place_bid(ids[0], "bench", next(amounts)).result(), rounds)
+                store.close()
+                print(f"   {count:>9} {name:>6} {opened * 1000:>8.1f}ms {get * 1e6:>8.0f}us "
+                      f"{page * 1e6:>8.0f}us {bid * 1e6:>8.0f}us")
+        finally:
+            shutil.rmtree(workdir)
+
+def bench_login_storm(duration=3.0):
+    """Bid latency while a burst of logins is verified in request threads vs in the hashing pool."""
+    print(f"Bid latency during a login storm ({duration:.0f}s, scrypt n=2**14)")
+    print(f"   {'logins run':>18} {'bids':>6} {'p50':>10} {'p99':>10} {'logins':>7}")
+    workdir = tempfile.mkdtemp()
+    store = AuctionStore(os.path.join(workdir, "data.json"))
+    now = time.time()
+    store.create_auction({"id": "a1", "item": "i", "description": "", "seller": "s", "highest_bid": 0,
+                          "highest_bidder": None, "status": "open", "start_time": now,
+                          "end_time": now + 3600}).result()
+    hasher = PasswordHasher()
+    stored = hasher.hash("password").result()
+    amounts = iter(range(1, 10 ** 9))
+
+    def run(storm):
+        stop = threading.Event()
+        logins = []
+        storm_thread = threading.Thread(target=storm, args=(stop, logins))
+        storm_thread.start()
+        latencies = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            store.place_bid("a1", "bench", next(amounts)).result()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+        stop.set()
+        storm_thread.join()
+        return sorted(latencies), len(logins)
+
+    def no_storm(stop, logins):
+        stop.wait()
+
+    def thread_storm(stop, logins):
+        # what sync endpoints on FastAPI's 40-thread pool would do
+        def login():
+            while not stop.is_set():
+                hashlib.scrypt(b"password", salt=b"s" * 16, n=2 ** 14, r=8, p=1)
+                logins.append(1)
+        with ThreadPoolExecutor(40) as pool:
+            for _ in range(40):
+                pool.submit(login)
+
+    def pool_storm(stop, logins):
+        while not stop.is_set():
+            try:
+                hasher.verify("password", stored).add_done_callback(lambda _: logins.append(1))
+            except Overloaded:
+                time.sleep(0.005)
+
+    try:
+        for name, storm in (("none", no_storm), ("request threads", thread_storm), ("hashing pool", pool_storm)):
+            latencies, logins = run(storm)
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[int(len(latencies) * 0.99)]
+            print(f"   {name:>18} {len(latencies):>6} {p50 * 1000:>8.2f}ms {p99 * 1000:>8.2f}ms {logins:>7}")
+    finally:
+        hasher.close()
+        store.close()
+        shutil.rmtree(workdir)
+
+def bench_encoding(rounds=20):
+    """Size and round trip of GET /auctions as each payload encoding, envelope included."""
+    print(f"Payload encodings for the auction list (available: {', '.join(payloads.ENCODINGS)})")
+    print(f"   {'auctions':>9} {'encoding':>9} {'payload':>10} {'wire':>10} {'encode':>10} {'decode':>10}")
+    key = get_random_bytes(32)
+    for count in (100, 1000, 10_000):
+        page = [AuctionStore._view(a) for a in fake_auctions(count)]
+        for encoding in payloads.ENCODINGS:
+            def encode():
+                plaintext = payloads.encode(page, encoding)
+                iv = get_random_bytes(16)
+                ct = AES.new(key, AES.MODE_CBC, iv).encrypt(pad(plaintext, AES.block_size))
+                return json.dumps({"data": base64.b64encode(iv + ct).decode('utf-8')})
+
+            wire = encode()
+
+            def decode():
+                raw = base64.b64decode(json.loads(wire)["data"])
+                pt = unpad(AES.new(key, AES.MODE_CBC, raw[:16]).decrypt(raw[16:]), AES.block_size)
+                return payloads.decode(pt, encoding)
+
+            assert decode() == page
+            size = len(payloads.encode(page, encoding))
+            print(f"   {count:>9} {encoding:>9} {size / 1024:>8.1f}KB {len(wire) / 1024:>8.1f}KB "
+                  f"{measure(encode, rounds) * 1000:>8.2f}ms {measure(decode, rounds) * 1000:>8.2f}ms")
+
+def bench_raw_body(rounds=200):
+    """Server-side framing of one request and its response: base64 JSON envelope vs raw octet-stream."""
+    from pydantic import BaseModel
+
+    class EncryptedRequest(BaseModel):
+        data: str
+
+    print("Request/response framing (bytes on the wire and server CPU, encryption included)")
+    print(f"   {'exchange':>22} {'framing':>9} {'request':>9} {'response':>10} {'cpu':>10}")
+    key = get_random_bytes(32)
+
+    def encrypt(plaintext):
+        iv = get_random_bytes(16)
+        return iv + AES.new(key, AES.MODE_CBC, iv).encrypt(pad(plaintext, AES.block_size))
+
+    def decrypt(raw):
+        return unpad(AES.new(key, AES.MODE_CBC, raw[:16]).decrypt(raw[16:]), AES.block_size)
+
+    bid = json.dumps({"id": "auc_1764587522042", "bidder": "alice", "amount": 150}).encode()
+    listing = json.dumps([AuctionStore._view(a) for a in fake_auctions(100)]).encode()
+    exchanges = (("POST /bid", bid, json.dumps({"status": "accepted", "new_highest": 150}).encode()),
+                 ("GET /auctions (100)", b"", listing))
+
+    for name, request_plain, response_plain in exchanges:
+        raw_request = encrypt(request_plain) if request_plain else b""
+        envelope_request = json.dumps({"data": base64.b64encode(raw_request).decode()}).encode() if request_plain else b""
+
+        def envelope():
+            if envelope_request:
+                decrypt(base64.b64decode(EncryptedRequest.model_validate_json(envelope_request).data))
+            return json.dumps({"data": base64.b64encode(encrypt(response_plain)).decode('utf-8')}).encode()
+
+        def raw():
+            if raw_request:
+                decrypt(raw_request)
+            return encrypt(response_plain)
+
+        for framing, fn, request_body in (("envelope", envelope, envelope_request), ("raw", raw, raw_request)):
+            cpu = measure(fn, rounds)
+            print(f"   {name:>22} {framing:>9} {len(request_body):>8}B {len(fn()):>9}B {cpu * 1e6:>8.1f}us")
+
+def bench_cipher(target_bytes=32 << 20):
+    """Throughput of the CBC and GCM session modes and the cost of rejecting a garbage request."""
+    print("Session cipher modes (MB/s, decrypt is of a client request)")
+    print(f"   {'payload':>8} {'mode':>5} {'encrypt':>10} {'decrypt':>10} {'reject':>10}")
+    key = get_random_bytes(32)
+
+    def request(plaintext, mode):
+        # what a client sends, ciphers.encrypt builds responses
+        if mode == "gcm":
+            nonce = get_random_bytes(ciphers.GCM_NONCE_SIZE)
+            cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+            cipher.update(ciphers.REQUEST_AAD)
+            ct, tag = cipher.encrypt_and_digest(plaintext)
+            return nonce + ct + tag
+        return ciphers.encrypt(plaintext, key, "cbc")
+
+    def reject(garbage, mode):
+        # the work the server does before answering 400
+        try:
+            payloads.decode(ciphers.decrypt(garbage, key, mode))
+        except ValueError:
+            pass
+
+    for size in (64, 1024, 16 << 10, 256 << 10, 1 << 20):
+        plaintext = os.urandom(size)
+        rounds = max(3, target_bytes // size // 8)
+        for mode in ciphers.CIPHERS:
+            message = request(plaintext, mode)
+            garbage = os.urandom(len(message))
+            enc = measure(lambda: ciphers.encrypt(plaintext, key, mode), rounds)
+            dec = measure(lambda: ciphers.decrypt(message, key, mode), rounds)
+            rej = measure(lambda: reject(garbage, mode), rounds)
+            label = f"{size // 1024}KB" if size >= 1024 else f"{size}B"
+            print(f"   {label:>8} {mode:>5} {size / enc / 1e6:>10.1f} {size / dec / 1e6:>10.1f} {rej * 1e6:>8.1f}us")
+
+def bench_compression(rounds=5):
+    """Bytes saved and CPU spent compressing GET /auctions before encryption, per zlib level."""
+    print("Compression of the auction list (fake_auctions is more repetitive than a real catalogue)")
+    print(f"   {'auctions':>9} {'encoding':>9} {'level':>5} {'plaintext':>10} {'compressed':>11} "
+          f"{'saved':>6} {'compress':>10} {'decompress':>11}")
+    for count in (1000, 10_000, 100_000):
+        page = [AuctionStore._view(a) for a in fake_auctions(count)]
+        for encoding in payloads.ENCODINGS:
+            if encoding == "cbor":
+                continue
+            raw = payloads.encode(page, encoding)
+            for level in (1, 6, 9):
+                packed = payloads.compress(raw, "zlib", level=level)
+                assert payloads.decompress(packed, "zlib", max_size=len(raw)) == raw
+                n = rounds if count < 100_000 else 1
+                comp = measure(lambda: payloads.compress(raw, "zlib", level=level), n)
+                decomp = measure(lambda: payloads.decompress(packed, "zlib", max_size=len(raw)), n)
+                print(f"   {count:>9} {encoding:>9} {level:>5} {len(raw) / 1024:>8.0f}KB {len(packed) / 1024:>9.0f}KB "
+                      f"{1 - len(packed) / len(raw):>6.0%} {comp * 1000:>8.1f}ms {decomp * 1000:>9.1f}ms")
+
+def bench_broadcast(rounds=50):
+    """Server CPU per WebSocket event for N bound subscribers: each session key vs the broadcast key."""
+    print("Encrypted WebSocket event to N subscribers (GCM, queued for each, not sent)")
+    print(f"   {'subscribers':>11} {'per session':>12} {'broadcast key':>14} {'speedup':>8}")
+    message = {"event": "NEW_BID", "id": "auc_1764587522042", "bidder": "alice", "amount": 150,
+               "timestamp": "2025-11-03 12:30:00", "version": 42}
+    group_key = get_random_bytes(32)
+
+    def seal(payload):
+        sealed = ciphers.encrypt(payload.encode('utf-8'), group_key, "gcm", ciphers.EVENT_AAD + b"1")
+        return json.dumps({"epoch": 1, "data": base64.b64encode(sealed).decode('utf-8')})
+
+    for subscribers in (10, 100, 1000, 10_000):
+        session_keys = [get_random_bytes(32) for _ in range(subscribers)]
+
+        def per_session():
+            payload = json.dumps(message).encode('utf-8')
+            for key in session_keys:
+                json.dumps({"data": base64.b64encode(ciphers.encrypt(payload, key, "gcm")).decode('utf-8')})
+
+        manager = ConnectionManager(queue_size=rounds + 1, seal=seal)
+        for i in range(subscribers):
+            conn = Connection(object(), rounds + 1, None, f"session{i}")
+            manager.active_connections[conn.websocket] = conn
+            manager._add(conn, ALL)
+
+        def broadcast():
+            manager.broadcast("auc_1764587522042", message)
+
+        # one warm-up call each; the queues hold rounds + 1 events. Nothing
+        # drains them here, and the entries piling up would set off garbage
+        # collections a running server does not see
+        per_session()
+        broadcast()
+        gc.disable()
+        try:
+            each = measure(per_session, rounds)
+            once = measure(broadcast, rounds)
+        finally:
+            gc.enable()
+        print(f"   {subscribers:>11} {each * 1000:>10.2f}ms {once * 1000:>12.2f}ms {each / once:>7.1f}x")
+
+def bench_batch(lots=100, rounds=5):
+    """Bidding on and reading `lots` auctions through the app: one request per operation vs one /batch."""
+    from Crypto.Cipher import PKCS1_v1_5
+    from Crypto.PublicKey import RSA as RSAKey
+    from fastapi.testclient import TestClient
+
+    print(f"{lots} operations per round, in-process ASGI client (no network: real round trips widen the gap)")
+    print(f"   {'operation':>10} {'requests':>12} {'batch':>10} {'speedup':>8}")
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    # main creates its key and data.json in the working directory
+    os.chdir(workdir)
+    try:
+        import main
+        with TestClient(main.app) as client:
+            public_key = RSAKey.import_key(client.get("/public-key").json()["key"])
+            key = get_random_bytes(32)
+            encrypted_key = PKCS1_v1_5.new(public_key).encrypt(base64.b64encode(key))
+            session_id = client.post("/handshake", json={"encrypted_key": base64.b64encode(encrypted_key).decode()}).json()["session_id"]
+            headers = {"X-Session-ID": session_id}
+
+            def encrypted(data):
+                return {"data": base64.b64encode(ciphers.encrypt(json.dumps(data).encode('utf-8'), key)).decode('utf-8')}
+
+            ids = [f"lot{i}" for i in range(lots)]
+            client.post("/batch", headers=headers, json=encrypted({"operations": [
+                {"op": "create_auction", "id": i, "item": "item", "seller": "seller", "min_price": 1, "time_remaining": 3600}
+                for i in ids]}))
+            amount = [1]
+
+            def bids_each():
+                amount[0] += 1
+                for i in ids:
+                    assert client.post("/bid", headers=headers, json=encrypted({"id": i, "bidder": "b", "amount": amount[0]})).status_code == 200
+
+            def bids_batch():
+                amount[0] += 1
+                client.post("/batch", headers=headers, json=encrypted({"operations": [
+                    {"op": "bid", "id": i, "bidder": "b", "amount": amount[0]} for i in ids]}))
+
+            def gets_each():
+                for i in ids:
+                    client.get(f"/auction/{i}", headers=headers)
+
+            def gets_batch():
+                client.post("/batch", headers=headers, json=encrypted({"operations": [
+                    {"op": "get_auction", "id": i} for i in ids]}))
+
+            for name, each, batched in (("bid", bids_each, bids_batch), ("get", gets_each, gets_batch)):
+                t_each = measure(each, rounds)
+                t_batch = measure(batched, rounds)
+                print(f"   {name:>10} {t_each * 1000:>10.1f}ms {t_batch * 1000:>8.1f}ms {t_each / t_batch:>7.1f}x")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+BENCHMARKS = {
+    "rsa-private": bench_rsa_private,
+    "keygen": bench_keygen,
+    "fanout": bench_fanout,
+    "storage": bench_storage,
+    "login-storm": bench_login_storm,
+    "encoding": bench_encoding,
+    "raw-body": bench_raw_body,
+    "cipher": bench_cipher,
+    "compression": bench_compression,
+    "broadcast": bench_broadcast,
+    "batch": bench_batch,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name}, choose from: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[name]()
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from Crypto.Random import get_random_bytes
+
+class BroadcastKeys:
+    """
+    Epoch-numbered AES keys shared by every WebSocket client bound to a
+    session, so an event is encrypted once for all of them.
+
+    `current` returns the key of the latest epoch and starts a new epoch
+    once it is `rotate_every` seconds old; `rotate` starts one straight away
+    (a session was revoked). Clients are handed each new key over their own
+    session's encryption and should keep the previous one for a moment, as
+    events already queued stay under it.
+    """
+
+    def __init__(self, rotate_every: float = 600.0):
+        self.rotate_every = rotate_every
+        self._lock = threading.Lock()
+        self.rotations = 0
+        self._epoch = 0
+        self._key = b""
+        # stale, so the first current() starts epoch 1
+        self._created = 0.0
+
+    def current(self) -> Tuple[int, bytes]:
+        with self._lock:
+            if time.time() - self._created <= self.rotate_every:
+                return self._epoch, self._key
+        self.rotate()
+        return self.current()
+
+    def rotate(self) -> int:
+        with self._lock:
+            self._epoch += 1
+            self._key = get_random_bytes(32)
+            self._created = time.time()
+            self.rotations += 1
+            return self._epoch
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"epoch": self._epoch, "rotations": self.rotations}
+
+class SqliteBroadcastKeys(BroadcastKeys):
+    """
+    Keys kept in a SQLite file (the sessions database) so every worker
+    encrypts under the same epoch. The latest epoch is re-read at most every
+    `refresh` seconds; a worker finding it stale inserts the next epoch, and
+    when several race the primary key lets only one of them win.
+
+    The table holds keys: the file is created readable by the owner only.
+    """
+
+    # rows kept; only the latest epoch is used, older ones are history
+    KEEP = 16
+
+    def __init__(self, path: str, rotate_every: float = 600.0, refresh: float = 1.0):
+        self.path = path
+        self.refresh = refresh
+        self._local = threading.local()
+        self._cached: Optional[Tuple[int, bytes, float]] = None
+        self._checked = 0.0
+
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS broadcast_keys ("
+            " epoch INTEGER PRIMARY KEY, key BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        super().__init__(rotate_every)
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite3 connections are not shareable
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _latest(self) -> Optional[Tuple[int, bytes, float]]:
+        return self._db().execute(
+            "SELECT epoch, key, created FROM broadcast_keys ORDER BY epoch DESC LIMIT 1"
+        ).fetchone()
+
+    def current(self) -> Tuple[int, bytes]:
+        now = time.time()
+        with self._lock:
+            cached = self._cached
+            if cached is not None and now - self._checked <= self.refresh and now - cached[2] <= self.rotate_every:
+                return cached[0], cached[1]
+        latest = self._latest()
+        if latest is None or now - latest[2] > self.rotate_every:
+            self._insert(1 if latest is None else latest[0] + 1)
+            latest = self._latest()
+        with self._lock:
+            self._cached = latest
+            self._checked = now
+        return latest[0], latest[1]
+
+    def _insert(self, epoch: int) -> bool:
+        # False when another worker already started this epoch
+        db = self._db()
+        inserted = db.execute("INSERT OR IGNORE INTO broadcast_keys (epoch, key, created) VALUES (?, ?, ?)",
+                              (epoch, get_random_bytes(32), time.time())).rowcount
+        db.execute("DELETE FROM broadcast_keys WHERE epoch <= ?", (epoch - self.KEEP,))
+        with self._lock:
+            if inserted:
+                self.rotations += 1
+            # picked up by the next current()
+            self._cached = None
+        return bool(inserted)
+
+    def rotate(self) -> int:
+        # unlike a scheduled rotation, always moves past the latest epoch
+        while True:
+            latest = self._latest()
+            epoch = 1 if latest is None else latest[0] + 1
+            if self._insert(epoch):
+                return epoch
+
+    def stats(self) -> dict:
+        latest = self._latest()
+        with self._lock:
+            # rotations are per worker process, the epoch is shared
+            return {"epoch": latest[0] if latest else 0, "rotations": self.rotations}
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+class PlaintextCache:
+    """
+    Small LRU of serialized responses.
+
+    Keys include the store (or auction) version they were built from, so an
+    entry never has to be invalidated: a mutation changes the version and
+    later lookups simply miss.
+
+    The cache is bounded by the bytes it holds rather than its entry count:
+    open catalogues are rebuilt every second and each may be large. A value
+    is a bytes body or a tuple starting with one.
+    """
+
+    def __init__(self, maxbytes: int = 32 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        body = value[0] if isinstance(value, tuple) else value
+        return len(body)
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # built outside the lock; two racing misses just build it twice
+        value = build()
+        size = self._sizeof(value)
+        if size > self.maxbytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.maxbytes:
+                self.size -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,104 @@
+import itertools
+import os
+import threading
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+from Crypto.Util.Padding import pad, unpad
+
+try:
+    # OpenSSL's GCM: same output, but pycryptodome rebuilds its GHASH tables
+    # for every message, which dominates small payloads
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+# Session cipher modes, negotiated at /handshake.
+#
+# cbc: iv (16) + AES-CBC(PKCS#7 padded plaintext), what clients have always sent.
+# gcm: nonce (12) + AES-GCM ciphertext + tag (16). Requests and responses are
+#      authenticated with different associated data, so a response can not be
+#      replayed to the server as a request.
+
+DEFAULT_CIPHER = "cbc"
+CIPHERS = ("cbc", "gcm")
+
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+REQUEST_AAD = b"request"
+RESPONSE_AAD = b"response"
+# WebSocket events under a broadcast key, followed by the epoch (see broadcastkeys.py)
+EVENT_AAD = b"event:"
+
+class NonceSequence:
+    """
+    GCM nonces for the server side: a random 8-byte prefix and a 4-byte
+    counter. Every process (worker) draws its own prefix, so nonces stay
+    unique under a session key that several workers encrypt with, without
+    sharing a counter. A new prefix is drawn when the counter wraps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._renew()
+
+    def _renew(self):
+        self._prefix = get_random_bytes(8)
+        self._counter = itertools.count()
+
+    def next(self) -> bytes:
+        with self._lock:
+            n = next(self._counter)
+            if n >= 1 << 32:
+                self._renew()
+                n = next(self._counter)
+            return self._prefix + n.to_bytes(4, "big")
+
+_nonces = NonceSequence()
+
+def _reseed_after_fork():
+    # a forked worker must not continue its parent's sequence
+    global _nonces
+    _nonces = NonceSequence()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed_after_fork)
+
+def negotiate(offered) -> str:
+    """First mode of the client's preference list the server supports."""
+    for name in offered or ():
+        if name in CIPHERS:
+            return name
+    return DEFAULT_CIPHER
+
+def encrypt(plaintext: bytes, key: bytes, mode: str = DEFAULT_CIPHER, aad: bytes = RESPONSE_AAD) -> bytes:
+    if mode == "gcm":
+        nonce = _nonces.next()
+        if AESGCM is not None:
+            return nonce + AESGCM(key).encrypt(nonce, plaintext, aad)
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce, mac_len=GCM_TAG_SIZE)
+        cipher.update(aad)
+        ct, tag = cipher.encrypt_and_digest(plaintext)
+        return nonce + ct + tag
+    iv = get_random_bytes(16)
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    return iv + cipher.encrypt(pad(plaintext, AES.block_size))
+
+def decrypt(data: bytes, key: bytes, mode: str = DEFAULT_CIPHER) -> bytes:
+    """Raises ValueError on malformed or (gcm) tampered input."""
+    if mode == "gcm":
+        if len(data) < GCM_NONCE_SIZE + GCM_TAG_SIZE:
+            raise ValueError("Message too short")
+        if AESGCM is not None:
+            try:
+                return AESGCM(key).decrypt(data[:GCM_NONCE_SIZE], data[GCM_NONCE_SIZE:], REQUEST_AAD)
+            except InvalidTag:
+                raise ValueError("MAC check failed")
+        cipher = AES.new(key, AES.MODE_GCM, nonce=data[:GCM_NONCE_SIZE], mac_len=GCM_TAG_SIZE)
+        cipher.update(REQUEST_AAD)
+        return cipher.decrypt_and_verify(data[GCM_NONCE_SIZE:-GCM_TAG_SIZE], data[-GCM_TAG_SIZE:])
+    if len(data) < 32 or len(data) % AES.block_size:
+        raise ValueError("Message length is not a whole number of blocks")
+    cipher = AES.new(key, AES.MODE_CBC, data[:16])
+    return unpad(cipher.decrypt(data[16:]), AES.block_size)
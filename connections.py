@@ -0,0 +1,257 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+# close code sent to clients that could not keep up (RFC 6455 "Try Again Later")
+WS_LAGGING = 1013
+# close code sent to clients whose session is gone (RFC 6455 "Policy Violation")
+WS_REVOKED = 1008
+
+# topic receiving auction creations
+CATALOGUE = "catalogue"
+# topic receiving every event; connections start on it until they subscribe
+ALL = "*"
+
+MAX_TOPICS = 1000
+
+class Outbox:
+    """
+    Bounded FIFO of encoded messages.
+
+    Entries put with a coalescing key replace the payload of the entry with
+    the same key that is still waiting, instead of queueing behind it. With a
+    window, a coalescable entry is held until it is `window` seconds old so a
+    burst collapses into its latest value.
+
+    An entry put without a key is a barrier: later entries are never merged
+    into slots ahead of it, so nothing overtakes it (a KEY message stays
+    ahead of the events sealed under that key).
+    """
+
+    def __init__(self, maxsize: int, window: Optional[float] = None):
+        self.maxsize = maxsize
+        self.window = window
+        self._items: Deque[List] = deque()
+        self._pending: Dict[str, List] = {}
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, payload: str, key: Optional[str] = None) -> bool:
+        """Returns False when the outbox is full."""
+        if self.window is None:
+            key = None
+        if key is not None:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] = payload
+                return True
+        if len(self._items) >= self.maxsize:
+            return False
+        entry = [key, payload, time.monotonic()]
+        self._items.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        else:
+            self._pending.clear()
+        self._ready.set()
+        return True
+
+    async def get(self) -> str:
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        entry = self._items[0]
+        if entry[0] is not None and self.window:
+            delay = entry[2] + self.window - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._items.popleft()
+        if entry[0] is not None and self._pending.get(entry[0]) is entry:
+            del self._pending[entry[0]]
+        return entry[1]
+
+class Connection:
+    def __init__(self, websocket: WebSocket, queue_size: int, coalesce_window: Optional[float],
+                 session_id: Optional[str] = None, session: Any = None):
+        self.websocket = websocket
+        # session the client bound the socket to at connect time, if any
+        self.session_id = session_id
+        self.session = session
+        self.queue = Outbox(queue_size, coalesce_window)
+        self.writer: Optional[asyncio.Task] = None
+        self.topics: Set[str] = set()
+        self.subscribed = False
+
+class ConnectionManager:
+    """
+    Each connection owns a bounded outgoing queue drained by its own writer
+    task. `broadcast` only enqueues, so a slow or stalled client never delays
+    the others or the request that produced the event. A client whose queue
+    overflows is considered lagging and is disconnected.
+
+    Events are published on a topic (an auction id, or CATALOGUE for
+    creations) and only reach the connections subscribed to it, found through
+    a topic -> connections index. Clients that never subscribe stay on ALL
+    and receive everything, as before topics existed.
+
+    A message is JSON-encoded once and the same string is queued for every
+    recipient. Messages broadcast with `coalesce=True` (NEW_BID) are merged
+    per connection and topic when `coalesce_window` is not None; see Outbox.
+
+    Connections bound to a session receive `seal(message JSON)` instead,
+    computed once per message too: an encryption under the broadcast key
+    every such client holds, not under each one's session key.
+    """
+
+    def __init__(self, queue_size: int = 256, coalesce_window: Optional[float] = None,
+                 seal: Optional[Callable[[str], str]] = None):
+        self.queue_size = queue_size
+        self.coalesce_window = coalesce_window
+        self.seal = seal
+        self.active_connections: Dict[WebSocket, Connection] = {}
+        self.topics: Dict[str, Set[Connection]] = {}
+        self.evicted = 0
+
+    async def connect(self, websocket: WebSocket, session_id: Optional[str] = None, session: Any = None):
+        await websocket.accept()
+        conn = Connection(websocket, self.queue_size, self.coalesce_window, session_id, session)
+        conn.writer = asyncio.create_task(self._writer(conn))
+        self.active_connections[websocket] = conn
+        self._add(conn, ALL)
+
+    def disconnect(self, websocket: WebSocket):
+        conn = self.active_connections.pop(websocket, None)
+        if conn is None:
+            return
+        for topic in list(conn.topics):
+            self._remove(conn, topic)
+        if conn.writer is not None:
+            conn.writer.cancel()
+
+    #Topics
+
+    def _add(self, conn: Connection, topic: str):
+        if len(conn.topics) >= MAX_TOPICS:
+            return
+        conn.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(conn)
+
+    def _remove(self, conn: Connection, topic: str):
+        conn.topics.discard(topic)
+        members = self.topics.get(topic)
+        if members is not None:
+            members.discard(conn)
+            if not members:
+                del self.topics[topic]
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        conn = self.active_connections.get(websocket)
+        if conn is None:
+            return
+        if not conn.subscribed:
+            # first explicit subscription replaces the implicit ALL
+            conn.subscribed = True
+            self._remove(conn, ALL)
+        for topic in topics:
+            self._add(conn, topic)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        conn = self.active_connections.get(websocket)
+        if conn is None:
+            return
+        for topic in topics:
+            self._remove(conn, topic)
+
+    def handle_message(self, websocket: WebSocket, text: str):
+        """
+        Client messages:
+        {"action": "subscribe", "topics": ["auction_id", "catalogue"]}
+        {"action": "unsubscribe", "topics": ["auction_id"]}
+        Anything else is ignored.
+        """
+        try:
+            message = json.loads(text)
+            action = message["action"]
+            topics = message["topics"]
+            if isinstance(topics, str):
+                topics = [topics]
+            topics = [str(t) for t in topics]
+        except (ValueError, KeyError, TypeError):
+            return
+        if action == "subscribe":
+            self.subscribe(websocket, topics)
+        elif action == "unsubscribe":
+            self.unsubscribe(websocket, topics)
+
+    async def _writer(self, conn: Connection):
+        try:
+            while True:
+                payload = await conn.queue.get()
+                await conn.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(conn.websocket)
+
+    def _evict(self, conn: Connection):
+        self.evicted += 1
+        self.disconnect(conn.websocket)
+        asyncio.create_task(self._close(conn.websocket, WS_LAGGING))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def broadcast(self, topic: str, message: dict, coalesce: bool = False):
+        targets = self.topics.get(topic, set()) | self.topics.get(ALL, set())
+        if not targets:
+            return
+        payload = json.dumps(message)
+        sealed = None
+        key = f"{message.get('event')}:{topic}" if coalesce else None
+        for conn in targets:
+            if conn.session_id is not None and self.seal is not None:
+                if sealed is None:
+                    sealed = self.seal(payload)
+                ok = conn.queue.put(sealed, key)
+            else:
+                ok = conn.queue.put(payload, key)
+            if not ok:
+                self._evict(conn)
+
+    #Session-bound connections
+
+    def bound(self) -> Dict[str, List[Connection]]:
+        """Connections per session id."""
+        by_session: Dict[str, List[Connection]] = {}
+        for conn in self.active_connections.values():
+            if conn.session_id is not None:
+                by_session.setdefault(conn.session_id, []).append(conn)
+        return by_session
+
+    def send(self, websocket: WebSocket, payload: str):
+        """Queues a message for one connection (a key handed to its session)."""
+        conn = self.active_connections.get(websocket)
+        if conn is not None and not conn.queue.put(payload):
+            self._evict(conn)
+
+    def revoke(self, websocket: WebSocket):
+        if websocket in self.active_connections:
+            self.disconnect(websocket)
+            asyncio.create_task(self._close(websocket, WS_REVOKED))
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.active_connections),
+            "encrypted": sum(1 for conn in self.active_connections.values() if conn.session_id is not None),
+            "topics": len(self.topics),
+            "evicted": self.evicted
+        }
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import sys
+from typing import Optional, Set
+
+from connections import ConnectionManager
+
+# Events (NEW_BID, END, CREAT) are published locally and, when several
+# worker processes run, relayed to the other workers through a broker
+# listening on a Unix socket. Frames are single JSON lines:
+# {"topic": "...", "coalesce": false, "message": {...}}
+
+# longest frame accepted, a CREAT carries a whole auction
+MAX_FRAME = 1 << 20
+
+class EventBroker:
+    """
+    Relays every line received from a worker to all the other connected
+    workers. Lines are forwarded as they are, without decoding. A worker
+    whose unsent backlog grows past `max_buffer` bytes is dropped; it
+    reconnects on its own.
+    """
+
+    def __init__(self, path: str, max_buffer: int = 8 * MAX_FRAME):
+        self.path = path
+        self.max_buffer = max_buffer
+        self._peers: Set[asyncio.StreamWriter] = set()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, self.path, limit=MAX_FRAME)
+        os.chmod(self.path, 0o600)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.endswith(b"\n"):
+                    break
+                for peer in list(self._peers):
+                    if peer is writer:
+                        continue
+                    if peer.transport.get_write_buffer_size() > self.max_buffer:
+                        self._peers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+def run_broker(path: str):
+    asyncio.run(EventBroker(path).serve())
+
+class EventBus:
+    """
+    Publishes events to the local ConnectionManager and, with a broker
+    `path`, to every other worker. Events received from the broker are
+    broadcast to the local connections only.
+
+    Without a path (single process) this is a plain pass-through to
+    `manager.broadcast`. While the broker is unreachable events still reach
+    the local clients; the ones that could not be relayed, including frames
+    longer than MAX_FRAME, are counted in `dropped`.
+    """
+
+    def __init__(self, manager: ConnectionManager, path: Optional[str] = None, reconnect_delay: float = 0.5):
+        self.manager = manager
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Event] = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    async def start(self, timeout: float = 1.0):
+        """Starts relaying, waiting up to `timeout` seconds for the broker."""
+        if not self.path or self._task is not None:
+            return
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME)
+            except OSError:
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            self._writer = writer
+            self._connected.set()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    self._deliver(line)
+            except (ConnectionError, ValueError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _deliver(self, line: bytes):
+        try:
+            frame = json.loads(line)
+            topic, message, coalesce = frame["topic"], frame["message"], frame["coalesce"]
+        except (ValueError, KeyError, TypeError):
+            return
+        self.received += 1
+        self.manager.broadcast(topic, message, coalesce)
+
+    def publish(self, topic: str, message: dict, coalesce: bool = False):
+        self.manager.broadcast(topic, message, coalesce)
+        if not self.path:
+            return
+        if self._writer is None or self._writer.transport.get_write_buffer_size() > 8 * MAX_FRAME:
+            self.dropped += 1
+            return
+        frame = json.dumps({"topic": topic, "coalesce": coalesce, "message": message}).encode() + b"\n"
+        if len(frame) > MAX_FRAME:
+            # the broker would drop the whole link on it, not just this event
+            self.dropped += 1
+            return
+        self._writer.write(frame)
+        self.published += 1
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._writer is not None,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped
+        }
+
+if __name__ == "__main__":
+    # usage: python eventbus.py /path/to/events.sock
+    run_broker(sys.argv[1])
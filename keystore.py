@@ -0,0 +1,53 @@
+import os
+import time
+from typing import Dict, Optional
+
+from Crypto.PublicKey import RSA as PemRSA
+
+from RSA import RSA as CustomRSA
+
+SERVER_KEY_FILE = os.environ.get("SERVER_KEY_FILE", "server_key.pem")
+
+def save_server_key(rsa: CustomRSA, path: str) -> bool:
+    """
+    Write the key next to `path` then hard-link it into place, so that when
+    several workers start at once only the first key is kept.
+    Returns False if another process saved one first.
+    """
+    (e, n) = rsa.public
+    (d, _) = rsa.private
+    p, q = rsa.crt[0], rsa.crt[1]
+    pem = PemRSA.construct((n, e, d, p, q)).export_key("PEM")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+def load_server_key(path: str) -> CustomRSA:
+    with open(path, "rb") as f:
+        key = PemRSA.import_key(f.read())
+    return CustomRSA.fromComponents(key.e, key.d, key.p, key.q)
+
+def load_or_create_server_key(path: str, timings: Optional[Dict[str, float]] = None) -> CustomRSA:
+    """Load the key at `path`, generating and saving one first if there is none."""
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
+    if not os.path.exists(path):
+        generated = CustomRSA(1024, parallel=True)
+        timings["server_key_generate"] = time.perf_counter() - start
+        if save_server_key(generated, path):
+            return generated
+        start = time.perf_counter()
+    rsa = load_server_key(path)
+    timings["server_key_load"] = time.perf_counter() - start
+    return rsa
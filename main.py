@@ -1,20 +1,27 @@
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, status, Request, Depends, Header
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, Depends, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional, Dict, Any, Tuple
 import json
 import time
 import asyncio
 import hashlib
 import os
-import uuid
 import base64
-from RSA import RSA as CustomRSA
-from Crypto.Cipher import AES, PKCS1_v1_5
-from Crypto.Util.Padding import pad, unpad
-from Crypto.Random import get_random_bytes
+from store import AuctionStore, SqliteAuctionStore, StoreError, NotFound
+from scheduler import ExpiryScheduler
+from connections import ConnectionManager, CATALOGUE, WS_REVOKED
+from eventbus import EventBus
+from cache import PlaintextCache
+from sessions import Session, SessionStore, SqliteSessionStore
+from broadcastkeys import BroadcastKeys, SqliteBroadcastKeys
+from keystore import SERVER_KEY_FILE, load_or_create_server_key
+from passwords import PasswordHasher, Overloaded
+import payloads
+import ciphers
+from Crypto.Cipher import PKCS1_v1_5
 
 app = FastAPI()
 
@@ -25,14 +32,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 DATA_FILE = "data.json"
 
+# largest page GET /auctions returns when a limit is requested
+MAX_PAGE_SIZE = 500
+
+# time spent in each startup phase, in seconds (see /stats)
+STARTUP_TIMINGS: Dict[str, float] = {}
+
 #Sec
 
-# Custom RSA Key Generation
-custom_rsa = CustomRSA(1024)
+# Persistent RSA key (generated on first start)
+custom_rsa = load_or_create_server_key(SERVER_KEY_FILE, STARTUP_TIMINGS)
 (e, n) = custom_rsa.public
 
 #DER Encoder for RSA Public Key
@@ -72,7 +86,35 @@ def export_public_key_pem(n, e):
 
 public_key_pem = export_public_key_pem(n, e)
 
-SESSIONS: Dict[str, bytes] = {}
+# the key never changes while the process runs, so neither does the response
+PUBLIC_KEY_BODY = json.dumps({"key": public_key_pem}).encode('utf-8')
+PUBLIC_KEY_ETAG = '"' + hashlib.sha256(PUBLIC_KEY_BODY).hexdigest()[:32] + '"'
+
+# handshakes kept at most; the least recently used session is dropped beyond it
+MAX_SESSIONS = 10000
+# seconds without a request, and seconds since the handshake, before a session expires
+SESSION_IDLE_TTL = 30 * 60
+SESSION_MAX_LIFETIME = 12 * 60 * 60
+
+# set by serve.py when running several workers, so they share handshakes
+SESSION_DB = os.environ.get("SESSION_DB")
+
+if SESSION_DB:
+    sessions = SqliteSessionStore(SESSION_DB, MAX_SESSIONS, SESSION_IDLE_TTL, SESSION_MAX_LIFETIME)
+else:
+    sessions = SessionStore(MAX_SESSIONS, SESSION_IDLE_TTL, SESSION_MAX_LIFETIME)
+
+# scrypt runs in its own processes; past PASSWORD_MAX_PENDING waiting jobs
+# /register and /login answer 503 instead of queueing
+PASSWORD_WORKERS = int(os.environ.get("PASSWORD_WORKERS", min(2, os.cpu_count() or 1)))
+PASSWORD_MAX_PENDING = int(os.environ.get("PASSWORD_MAX_PENDING", 64))
+
+hasher = PasswordHasher(PASSWORD_WORKERS, PASSWORD_MAX_PENDING)
+
+# for sessions that negotiated compression: plaintexts shorter than
+# COMPRESSION_MIN_SIZE bytes go uncompressed, the rest at zlib COMPRESSION_LEVEL
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", 6))
 
 #Data classes
 
@@ -94,6 +136,7 @@ class Auction(BaseModel):
     status: str
     time_remaining: int
     start_time: Optional[float] = None
+    end_time: Optional[float] = None
 
 class Bid(BaseModel):
     id: str
@@ -108,114 +151,264 @@ class CreateAuction(BaseModel):
     min_price: int
     time_remaining: int
 
+class AuctionRef(BaseModel):
+    id: str
+
+class BatchRequest(BaseModel):
+    operations: List[Dict[str, Any]]
+
 class EncryptedRequest(BaseModel):
     data: str
 
 #Save data
 
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {"users": [], "auctions": []}
-    with open(DATA_FILE, "r") as f:
-        return json.load(f)
-
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+# storage backend for users and auctions: "json" (data.json) or "sqlite"
+STORAGE = os.environ.get("STORAGE", "json")
+STORAGE_DB = os.environ.get("STORAGE_DB", "data.db")
+
+_start = time.perf_counter()
+if STORAGE == "json":
+    store = AuctionStore(DATA_FILE)
+elif STORAGE == "sqlite":
+    # filled from data.json the first time it is opened
+    store = SqliteAuctionStore(STORAGE_DB, migrate_from=DATA_FILE)
+else:
+    raise RuntimeError(f"Unknown STORAGE backend: {STORAGE}")
+STARTUP_TIMINGS["store_load"] = time.perf_counter() - _start
+
+def store_error(e: StoreError) -> HTTPException:
+    if isinstance(e, NotFound):
+        return HTTPException(status_code=404, detail=e.detail)
+    return HTTPException(status_code=400, detail=e.detail)
 
 #WebSocket
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-manager = ConnectionManager()
+# NEW_BID events for one auction still queued for a client within this
+# many seconds are merged into the latest one
+WS_COALESCE_WINDOW = 0.05
+
+# legacy clients that do not bind their socket to a session get the events
+# in plaintext; with WS_PLAINTEXT=0 they are refused, so only live sessions
+# can follow events (the bundled client always binds)
+WS_PLAINTEXT = os.environ.get("WS_PLAINTEXT", "1") != "0"
+
+# events to sockets bound to a session are encrypted once under a broadcast
+# key, rotated every BROADCAST_KEY_TTL seconds and when a session holding it
+# is revoked
+BROADCAST_KEY_TTL = float(os.environ.get("BROADCAST_KEY_TTL", 600))
+# seconds between checks for a new epoch to hand out; revocations within
+# one check share a single rotation
+BROADCAST_KEY_CHECK = 1.0
+
+if SESSION_DB:
+    # shared by the workers along with the sessions
+    broadcast_keys = SqliteBroadcastKeys(SESSION_DB, BROADCAST_KEY_TTL, BROADCAST_KEY_CHECK)
+else:
+    broadcast_keys = BroadcastKeys(BROADCAST_KEY_TTL)
+
+# the epoch events are sealed under: the latest one already handed to this
+# worker's sockets, so a client always holds a key before events use it
+# (set at startup)
+sealing_key: Optional[Tuple[int, bytes]] = None
+# set by DELETE /session, carried out at the next check
+rotation_due = False
+
+def seal_event(payload: str) -> str:
+    epoch, key = sealing_key
+    sealed = ciphers.encrypt(payload.encode('utf-8'), key, "gcm", ciphers.EVENT_AAD + str(epoch).encode())
+    return json.dumps({"epoch": epoch, "data": base64.b64encode(sealed).decode('utf-8')})
+
+manager = ConnectionManager(coalesce_window=WS_COALESCE_WINDOW, seal=seal_event)
+
+# Unix socket of the broker relaying events between workers (set by serve.py)
+EVENT_BUS = os.environ.get("EVENT_BUS")
+events = EventBus(manager, EVENT_BUS)
 
 #Timer
 
-async def auction_timer_loop():
+async def expire_auction(auction_id: str):
+    try:
+        auction = await asyncio.wrap_future(store.close_auction(auction_id))
+    except StoreError:
+        return
+
+    # Broadcast END event
+    events.publish(auction["id"], {
+        "event": "END",
+        "id": auction["id"],
+        "highest_bid": auction["highest_bid"],
+        "highest_bidder": auction["highest_bidder"],
+        "version": auction["version"]
+    })
+
+scheduler = ExpiryScheduler(expire_auction)
+
+#Broadcast keys
+
+def key_message(epoch: int, key: bytes, session: Session) -> str:
+    # the broadcast key travels under the session's own key and options
+    plaintext = pack({"epoch": epoch, "key": base64.b64encode(key).decode('utf-8')}, session)
+    return json.dumps({"event": "KEY", "data": base64.b64encode(encrypt_bytes(plaintext, session)).decode('utf-8')})
+
+def hand_out_key(epoch: int, key: bytes, live: Dict[str, bool]):
+    """Sends a new broadcast key to every bound socket, then seals with it."""
+    global sealing_key
+    # sockets of revoked or expired sessions are closed instead; those bound
+    # after `live` was looked up have just been checked
+    for session_id, conns in manager.bound().items():
+        for conn in conns:
+            if live.get(session_id, True):
+                manager.send(conn.websocket, key_message(epoch, key, conn.session))
+            else:
+                manager.revoke(conn.websocket)
+    sealing_key = (epoch, key)
+
+async def refresh_broadcast_key():
+    global rotation_due
+    # both stores may be SQLite files other workers write to: kept off the event loop
+    if rotation_due:
+        rotation_due = False
+        await asyncio.to_thread(broadcast_keys.rotate)
+    epoch, key = await asyncio.to_thread(broadcast_keys.current)
+    if sealing_key is not None and sealing_key[0] == epoch:
+        return
+    bound = list(manager.bound())
+    live = await asyncio.to_thread(lambda: {session_id: sessions.get(session_id, touch=False) is not None
+                                            for session_id in bound})
+    hand_out_key(epoch, key, live)
+
+async def rotate_broadcast_keys():
+    # picks up scheduled rotations, revocations and rotations by other workers
     while True:
-        data = load_data()
-        changed = False
-        
-        for auction in data["auctions"]:
-            if auction["status"] == "open":
-                if auction["time_remaining"] > 0:
-                    auction["time_remaining"] -= 1
-                    changed = True
-                else:
-                    auction["status"] = "closed"
-                    changed = True
-                    # Broadcast END event
-                    await manager.broadcast({
-                        "event": "END",
-                        "id": auction["id"],
-                        "highest_bid": auction["highest_bid"],
-                        "highest_bidder": auction["highest_bidder"]
-                    })
-        
-        if changed:
-            save_data(data)
-            
-        await asyncio.sleep(1)
+        await asyncio.sleep(BROADCAST_KEY_CHECK)
+        try:
+            await refresh_broadcast_key()
+        except Exception as e:
+            print(f"Broadcast key error: {e}")
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(auction_timer_loop())
+    await refresh_broadcast_key()
+    await events.start()
+    for auction_id, end_time in store.open_deadlines():
+        scheduler.schedule(auction_id, end_time)
+    asyncio.create_task(scheduler.run())
+    asyncio.create_task(rotate_broadcast_keys())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await events.close()
+    hasher.close()
+    store.close()
 
 #Sec help functions
 
-def decrypt_data(encrypted_b64: str, aes_key: bytes) -> dict:
+def decrypt_data(encrypted_data: bytes, session: Session) -> dict:
     try:
-        encrypted_data = base64.b64decode(encrypted_b64)
-        iv = encrypted_data[:16]
-        ct = encrypted_data[16:]
-        cipher = AES.new(aes_key, AES.MODE_CBC, iv)
-        pt = unpad(cipher.decrypt(ct), AES.block_size)
-        return json.loads(pt.decode('utf-8'))
+        # with gcm, tampered or garbage input fails here before any decoding
+        pt = ciphers.decrypt(encrypted_data, session.key, session.cipher)
+        pt = payloads.decompress(pt, session.compression)
+        return payloads.decode(pt, session.encoding)
     except Exception as e:
         print(f"Decryption error: {e}")
         raise HTTPException(status_code=400, detail="Decryption failed")
 
-def encrypt_data(data: Any, aes_key: bytes) -> str:
-    json_str = json.dumps(data)
-    iv = get_random_bytes(16)
-    cipher = AES.new(aes_key, AES.MODE_CBC, iv)
-    ct = cipher.encrypt(pad(json_str.encode('utf-8'), AES.block_size))
-    return base64.b64encode(iv + ct).decode('utf-8')
+def pack(data: Any, session: Session) -> bytes:
+    # the plaintext of a response: encoded, then compressed if negotiated
+    return payloads.compress(payloads.encode(data, session.encoding), session.compression,
+                             COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL)
+
+def encrypt_bytes(plaintext: bytes, session: Session) -> bytes:
+    # plaintext comes from pack()
+    return ciphers.encrypt(plaintext, session.key, session.cipher)
+
+#Request and response bodies
+# Encrypted bodies are either the {"data": base64(encrypted)} envelope or,
+# with Content-Type: application/octet-stream, the encrypted bytes as they
+# are. See ciphers.py for their layout.
+
+OCTET_STREAM = "application/octet-stream"
+
+def is_raw(request: Request) -> bool:
+    # raw requests get raw responses; Accept lets GET requests ask for them
+    return (request.headers.get("content-type", "").startswith(OCTET_STREAM)
+            or OCTET_STREAM in request.headers.get("accept", ""))
+
+async def encrypted_body(request: Request) -> bytes:
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith(OCTET_STREAM):
+        return body
+    try:
+        return base64.b64decode(EncryptedRequest.model_validate_json(body).data)
+    except ValidationError:
+        raise HTTPException(status_code=422, detail="Invalid request body")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Decryption failed")
+
+def respond_bytes(request: Request, plaintext: bytes, session: Session,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    encrypted = encrypt_bytes(plaintext, session)
+    if is_raw(request):
+        return Response(content=encrypted, media_type=OCTET_STREAM, headers=headers)
+    return JSONResponse({"data": base64.b64encode(encrypted).decode('utf-8')}, headers=headers)
+
+def respond(request: Request, data: Any, session: Session) -> Response:
+    return respond_bytes(request, pack(data, session), session)
+
+#Response cache
+
+# bytes of serialized responses kept
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+plaintext_cache = PlaintextCache(RESPONSE_CACHE_BYTES)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def session_etag(version: int, bucket: Optional[int], request: Request, session_id: str) -> str:
+    # the body is encrypted for one session, as raw bytes or an envelope: a
+    # copy only stays valid for the same session and representation, and
+    # within the second its time_remaining values were computed in
+    tag = hashlib.sha256(f"{session_id}:{is_raw(request)}".encode()).hexdigest()[:16]
+    if bucket is None:
+        return f'W/"{version}-{tag}"'
+    return f'W/"{version}.{bucket}-{tag}"'
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # shared caches must not hand one session's copy to another
+    return {"ETag": etag, "Vary": "X-Session-ID, Accept", "Cache-Control": "private"}
+
+def time_bucket(may_be_open: bool) -> Optional[int]:
+    # time_remaining of open auctions changes once per second
+    return int(time.time()) if may_be_open else None
 
 #Endpoints
 
 @app.get("/public-key")
-def get_public_key():
-    return {"key": public_key_pem}
+async def get_public_key(if_none_match: Optional[str] = Header(None)):
+    headers = {"ETag": PUBLIC_KEY_ETAG, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, PUBLIC_KEY_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(content=PUBLIC_KEY_BODY, media_type="application/json", headers=headers)
 
 class HandshakeRequest(BaseModel):
     encrypted_key: str
+    # payload encodings, cipher modes and compressions the client accepts, in order of preference
+    encodings: Optional[List[str]] = None
+    ciphers: Optional[List[str]] = None
+    compression: Optional[List[str]] = None
 
 @app.post("/handshake")
 def handshake(req: HandshakeRequest):
     try:
         enc_key = base64.b64decode(req.encrypted_key)
         
-        #RSA Raw Decryption
+        #RSA Raw Decryption (CRT)
         c_int = int.from_bytes(enc_key, 'big')
         (d, n) = custom_rsa.private
-        m_int = pow(c_int, d, n)
+        m_int = custom_rsa.privatePow(c_int)
         
         key_length_bytes = (n.bit_length() + 7) // 8
         decrypted_block = m_int.to_bytes(key_length_bytes, 'big')
@@ -235,129 +428,206 @@ def handshake(req: HandshakeRequest):
             raise HTTPException(status_code=400, detail="Handshake failed")
 
         if len(aes_key) not in [16, 24, 32]:
-             pass
+            # rejected once here rather than on every request of the session
+            raise HTTPException(status_code=400, detail="Handshake failed")
 
-        session_id = str(uuid.uuid4())
-        SESSIONS[session_id] = aes_key
-        return {"session_id": session_id}
+        encoding = payloads.negotiate(req.encodings)
+        cipher = ciphers.negotiate(req.ciphers)
+        compression = payloads.negotiate_compression(req.compression)
+        session_id = sessions.create(aes_key, encoding, cipher, compression)
+        return {"session_id": session_id, "encoding": encoding, "cipher": cipher, "compression": compression}
     except Exception as e:
         print(f"Handshake error: {e}")
         raise HTTPException(status_code=400, detail="Handshake failed")
 
-def get_decrypted_body(req: EncryptedRequest, x_session_id: str):
-    if x_session_id not in SESSIONS:
-        raise HTTPException(status_code=401, detail="Invalid Session")
-    return decrypt_data(req.data, SESSIONS[x_session_id])
+def require_session(x_session_id: Optional[str]) -> Session:
+    session = sessions.get(x_session_id)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Session required")
+    return session
+
+async def session_for(x_session_id: Optional[str]) -> Session:
+    # async endpoints: the session store may be a SQLite file
+    return await asyncio.to_thread(require_session, x_session_id)
+
+@app.delete("/session")
+async def revoke_session(request: Request, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    global rotation_due
+    session = await session_for(x_session_id)
+
+    await asyncio.to_thread(sessions.revoke, x_session_id)
+    for conn in manager.bound().get(x_session_id, []):
+        manager.revoke(conn.websocket)
+    if session.keyed:
+        # it holds the broadcast key: everyone else moves to a new one at the
+        # next check, and other workers close its sockets then
+        rotation_due = True
+    resp = {"status": "revoked"}
+    return respond(request, resp, session)
+
+def hasher_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
+
+async def rehash_password(username: str, password: str):
+    # best effort: if the pool is busy it is retried at the next login
+    try:
+        stored = await asyncio.wrap_future(hasher.hash(password))
+        await asyncio.wrap_future(store.set_password(username, stored))
+    except (Overloaded, StoreError):
+        pass
 
 @app.post("/register")
-def register(req: EncryptedRequest, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
-    if not x_session_id or x_session_id not in SESSIONS:
-        raise HTTPException(status_code=401, detail="Session required")
+async def register(request: Request, ciphertext: bytes = Depends(encrypted_body), x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    session = await session_for(x_session_id)
     
-    body = decrypt_data(req.data, SESSIONS[x_session_id])
+    body = decrypt_data(ciphertext, session)
     user = User(**body)
+
+    if await asyncio.to_thread(store.find_user, user.username) is not None:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    try:
+        stored = await asyncio.wrap_future(hasher.hash(user.password))
+    except Overloaded:
+        raise hasher_busy()
     
-    data = load_data()
-    for u in data["users"]:
-        if u["username"] == user.username:
-            raise HTTPException(status_code=400, detail="Username already exists")
-    
-    data["users"].append(user.dict())
-    save_data(data)
+    try:
+        await asyncio.wrap_future(store.add_user({"username": user.username, "password": stored}))
+    except StoreError as e:
+        raise store_error(e)
     
     resp = {"status": "registered"}
-    return {"data": encrypt_data(resp, SESSIONS[x_session_id])}
+    return respond(request, resp, session)
 
 @app.post("/login")
-def login(req: EncryptedRequest, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
-    if not x_session_id or x_session_id not in SESSIONS:
-        raise HTTPException(status_code=401, detail="Session required")
+async def login(request: Request, ciphertext: bytes = Depends(encrypted_body), x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    session = await session_for(x_session_id)
 
-    body = decrypt_data(req.data, SESSIONS[x_session_id])
+    body = decrypt_data(ciphertext, session)
     user = UserLogin(**body)
 
-    data = load_data()
-    for u in data["users"]:
-        if u["username"] == user.username and u["password"] == user.password:
-             resp = {"status": "ok"}
-             return {"data": encrypt_data(resp, SESSIONS[x_session_id])}
-             
+    u = await asyncio.to_thread(store.find_user, user.username)
+    stored = u["password"] if u is not None else None
+    try:
+        # unknown users are checked against a dummy hash so both cases take as long
+        valid = await asyncio.wrap_future(hasher.verify(user.password, stored))
+    except Overloaded:
+        raise hasher_busy()
+
+    if u is not None and valid:
+        if hasher.needs_rehash(stored):
+            asyncio.create_task(rehash_password(user.username, user.password))
+        resp = {"status": "ok"}
+        return respond(request, resp, session)
+
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
 @app.get("/auctions")
-def get_auctions(x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
-    if not x_session_id or x_session_id not in SESSIONS:
-         raise HTTPException(status_code=401, detail="Session required")
-         
-    data = load_data()
-    resp = data["auctions"]
-    return {"data": encrypt_data(resp, SESSIONS[x_session_id])}
+def get_auctions(
+    request: Request,
+    status: Optional[str] = Query(None, pattern="^(open|closed)$"),
+    seller: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    x_session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    if_none_match: Optional[str] = Header(None)
+):
+    session = require_session(x_session_id)
+
+    try:
+        start = int(cursor) if cursor is not None else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if start < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+    field_list = tuple(f for f in fields.split(",") if f) if fields else None
+
+    version = store.version
+    bucket = time_bucket(status != "closed")
+    etag = session_etag(version, bucket, request, x_session_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+
+    def build():
+        page, next_cursor = store.list_auctions(status=status, seller=seller, cursor=start,
+                                                limit=limit, fields=field_list)
+        return pack(page, session), next_cursor
+
+    # cached compressed, so a catalogue is compressed once per version
+    key = ("auctions", session.encoding, session.compression, version, bucket, status, seller, start, limit, field_list)
+    plaintext, next_cursor = plaintext_cache.get_or_build(key, build)
+    headers = cache_headers(etag)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    return respond_bytes(request, plaintext, session, headers)
+
+@app.get("/auctions/changes")
+def get_auction_changes(request: Request, since: int, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    session = require_session(x_session_id)
+
+    changed, version = store.changes_since(since)
+    resp = {"version": version, "auctions": changed}
+    return respond(request, resp, session)
 
 @app.get("/auction/{auction_id}")
-def get_auction(auction_id: str, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
-    if not x_session_id or x_session_id not in SESSIONS:
-         raise HTTPException(status_code=401, detail="Session required")
+def get_auction(
+    auction_id: str,
+    request: Request,
+    x_session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    if_none_match: Optional[str] = Header(None)
+):
+    session = require_session(x_session_id)
 
-    data = load_data()
-    for auction in data["auctions"]:
-        if auction["id"] == auction_id:
-            return {"data": encrypt_data(auction, SESSIONS[x_session_id])}
-    raise HTTPException(status_code=404, detail="Auction not found")
+    try:
+        version, auction_status = store.auction_version(auction_id)
+    except StoreError as e:
+        raise store_error(e)
+    bucket = time_bucket(auction_status == "open")
+    etag = session_etag(version, bucket, request, x_session_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+
+    def build():
+        try:
+            return pack(store.get_auction(auction_id), session)
+        except StoreError as e:
+            raise store_error(e)
+
+    key = ("auction", session.encoding, session.compression, auction_id, version, bucket)
+    plaintext = plaintext_cache.get_or_build(key, build)
+    return respond_bytes(request, plaintext, session, cache_headers(etag))
 
 @app.post("/bid")
-async def place_bid(req: EncryptedRequest, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
-    if not x_session_id or x_session_id not in SESSIONS:
-        raise HTTPException(status_code=401, detail="Session required")
+async def place_bid(request: Request, ciphertext: bytes = Depends(encrypted_body), x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    session = await session_for(x_session_id)
         
-    body = decrypt_data(req.data, SESSIONS[x_session_id])
+    body = decrypt_data(ciphertext, session)
     bid = Bid(**body)
     
-    data = load_data()
-    found = False
-    for auction in data["auctions"]:
-        if auction["id"] == bid.id:
-            found = True
-            if auction["status"] != "open":
-                raise HTTPException(status_code=400, detail="Auction is closed")
-            if auction["time_remaining"] <= 0:
-                raise HTTPException(status_code=400, detail="Auction time expired")
-            
-            if bid.amount <= auction["highest_bid"]:
-                raise HTTPException(status_code=400, detail="Bid too low")
-            
-            auction["highest_bid"] = bid.amount
-            auction["highest_bidder"] = bid.bidder
-            
-            save_data(data)
-            
-            await manager.broadcast({
-                "event": "NEW_BID",
-                "id": auction["id"],
-                "bidder": auction["highest_bidder"],
-                "amount": auction["highest_bid"],
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-            })
-            
-            resp = {"status": "accepted", "new_highest": bid.amount}
-            return {"data": encrypt_data(resp, SESSIONS[x_session_id])}
-            
-    if not found:
-        raise HTTPException(status_code=404, detail="Auction not found")
-
-@app.post("/auction")
-async def create_auction(req: EncryptedRequest, x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
-    if not x_session_id or x_session_id not in SESSIONS:
-        raise HTTPException(status_code=401, detail="Session required")
-
-    body = decrypt_data(req.data, SESSIONS[x_session_id])
-    auction = CreateAuction(**body)
-
-    data = load_data()
-    for a in data["auctions"]:
-        if a["id"] == auction.id:
-            raise HTTPException(status_code=400, detail="Auction ID already exists")
-            
-    new_auction = {
+    try:
+        auction = await asyncio.wrap_future(store.place_bid(bid.id, bid.bidder, bid.amount))
+    except StoreError as e:
+        raise store_error(e)
+    announce_bid(auction)
+
+    resp = {"status": "accepted", "new_highest": bid.amount}
+    return respond(request, resp, session)
+
+def announce_bid(auction: dict):
+    events.publish(auction["id"], {
+        "event": "NEW_BID",
+        "id": auction["id"],
+        "bidder": auction["highest_bidder"],
+        "amount": auction["highest_bid"],
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "version": auction["version"]
+    }, coalesce=True)
+
+def new_auction_record(auction: CreateAuction) -> dict:
+    start_time = time.time()
+    return {
         "id": auction.id,
         "item": auction.item,
         "description": auction.description,
@@ -365,27 +635,134 @@ async def create_auction(req: EncryptedRequest, x_session_id: Optional[str] = He
         "highest_bid": auction.min_price,
         "highest_bidder": None,
         "status": "open",
-        "time_remaining": auction.time_remaining
+        "start_time": start_time,
+        "end_time": start_time + auction.time_remaining
     }
-    
-    data["auctions"].append(new_auction)
-    save_data(data)
-    
+
+def announce_auction(created: dict):
+    scheduler.schedule(created["id"], created["end_time"])
+
     #Broadcast creation
-    await manager.broadcast({
+    events.publish(CATALOGUE, {
         "event": "CREAT",
-        "id": new_auction["id"]
+        "id": created["id"],
+        "auction": created,
+        "version": created["version"]
     })
+
+@app.post("/auction")
+async def create_auction(request: Request, ciphertext: bytes = Depends(encrypted_body), x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    session = await session_for(x_session_id)
+
+    body = decrypt_data(ciphertext, session)
+    auction = CreateAuction(**body)
+
+    try:
+        created = await asyncio.wrap_future(store.create_auction(new_auction_record(auction)))
+    except StoreError as e:
+        raise store_error(e)
+    announce_auction(created)
     
     resp = {"status": "accepted", "new_highest": auction.min_price}
-    return {"data": encrypt_data(resp, SESSIONS[x_session_id])}
+    return respond(request, resp, session)
+
+#Batches
+
+# operations accepted in one /batch request
+MAX_BATCH_SIZE = 100
+
+BATCH_OPERATIONS = {"get_auction": AuctionRef, "bid": Bid, "create_auction": CreateAuction}
+
+@app.post("/batch")
+async def batch(request: Request, ciphertext: bytes = Depends(encrypted_body), x_session_id: Optional[str] = Header(None, alias="X-Session-ID")):
+    session = await session_for(x_session_id)
+
+    body = decrypt_data(ciphertext, session)
+    try:
+        # the body may not even be an object
+        req = BatchRequest.model_validate(body)
+    except ValidationError:
+        raise HTTPException(status_code=422, detail="Invalid request body")
+    if not req.operations or len(req.operations) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch holds 1 to {MAX_BATCH_SIZE} operations")
+
+    # malformed operations get their error in place, the others go to the store together
+    results: List[Optional[dict]] = [None] * len(req.operations)
+    parsed = []
+    for i, operation in enumerate(req.operations):
+        kind = operation.get("op")
+        model = BATCH_OPERATIONS.get(kind) if isinstance(kind, str) else None
+        if model is None:
+            results[i] = {"status": 400, "detail": "Unknown operation"}
+            continue
+        try:
+            parsed.append((i, kind, model(**{k: v for k, v in operation.items() if k != "op"})))
+        except ValidationError:
+            results[i] = {"status": 422, "detail": "Invalid operation"}
+
+    ops = []
+    for _, kind, args in parsed:
+        if kind == "get_auction":
+            ops.append(("get", args.id))
+        elif kind == "bid":
+            ops.append(("bid", args.id, args.bidder, args.amount))
+        else:
+            ops.append(("create", new_auction_record(args)))
+    outcomes = await asyncio.wrap_future(store.batch(ops)) if ops else []
+
+    for (i, kind, args), outcome in zip(parsed, outcomes):
+        if isinstance(outcome, StoreError):
+            results[i] = {"status": store_error(outcome).status_code, "detail": outcome.detail}
+        elif kind == "get_auction":
+            results[i] = {"status": 200, "data": outcome}
+        elif kind == "bid":
+            announce_bid(outcome)
+            results[i] = {"status": 200, "data": {"status": "accepted", "new_highest": args.amount}}
+        else:
+            announce_auction(outcome)
+            results[i] = {"status": 200, "data": {"status": "accepted", "new_highest": args.min_price}}
+
+    resp = {"results": results}
+    return respond(request, resp, session)
+
+@app.get("/stats")
+def get_stats():
+    return {
+        "bid_queue_depth": store.bid_queue_depths(),
+        "websockets": manager.stats(),
+        "event_bus": events.stats(),
+        "response_cache": plaintext_cache.stats(),
+        "startup": STARTUP_TIMINGS,
+        "sessions": sessions.stats(),
+        "broadcast_keys": broadcast_keys.stats(),
+        "password_hashing": hasher.stats()
+    }
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, session_id: Optional[str] = None):
+    # browsers can not set headers on a WebSocket, hence the query parameter
+    session_id = websocket.headers.get("x-session-id") or session_id
+    session = None
+    if session_id:
+        session = await asyncio.to_thread(sessions.get, session_id)
+        if session is None:
+            await websocket.close(code=WS_REVOKED)
+            return
+        # before the key is sent, so revoking the session rotates it
+        await asyncio.to_thread(sessions.mark_keyed, session_id)
+    elif not WS_PLAINTEXT:
+        await websocket.close(code=WS_REVOKED)
+        return
+    await manager.connect(websocket, session_id if session is not None else None, session)
+    if session is not None:
+        # the key is queued before any event sealed under it
+        manager.send(websocket, key_message(*sealing_key, session))
     try:
         while True:
             data = await websocket.receive_text()
+            manager.handle_message(websocket, data)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+# Stored format: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+# Anything else is a value stored before hashing existed (the SHA-256 hex
+# the client sends as `password`) and is compared as it is.
+
+PREFIX = "scrypt"
+
+class Overloaded(Exception):
+    """Too many hashes already waiting for the pool."""
+
+def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + (1 << 20), dklen=32)
+
+def _hash(password: str, n: int, r: int, p: int) -> str:
+    salt = os.urandom(16)
+    key = _derive(password, salt, n, r, p)
+    return "$".join((PREFIX, str(n), str(r), str(p),
+                     base64.b64encode(salt).decode(), base64.b64encode(key).decode()))
+
+def _parse(stored: str) -> Optional[Tuple[int, int, int, bytes, bytes]]:
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != PREFIX:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), base64.b64decode(parts[4]), base64.b64decode(parts[5])
+    except ValueError:
+        return None
+
+def _verify(password: str, stored: str) -> bool:
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    n, r, p, salt, key = parsed
+    return hmac.compare_digest(_derive(password, salt, n, r, p), key)
+
+def _lower_priority(niceness: int):
+    # KDF work yields the CPU to the request workers
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+class PasswordHasher:
+    """
+    scrypt hashing and verification run in a pool of `workers` processes, so
+    a burst of logins neither holds the GIL of the request workers nor
+    occupies FastAPI's thread pool. The pool processes run at a lower
+    priority (`niceness`), so bids keep the CPU first.
+
+    At most `max_pending` jobs may be queued or running; beyond that `hash`
+    and `verify` raise Overloaded straight away instead of queueing.
+
+    `needs_rehash` tells whether a stored value predates the current
+    parameters (or hashing altogether); it is rehashed at the next login.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, n: int = 2 ** 14, r: int = 8, p: int = 1,
+                 niceness: int = 5):
+        self.params = (n, r, p)
+        self.max_pending = max_pending
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority, initargs=(niceness,))
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.completed = 0
+        # verified against when the user does not exist, so that case takes as long
+        self._dummy = _hash("", n, r, p)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded()
+            self._pending += 1
+        fut = self._pool.submit(fn, *args)
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, _):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def hash(self, password: str) -> Future:
+        return self._submit(_hash, password, *self.params)
+
+    def verify(self, password: str, stored: Optional[str]) -> Future:
+        """Future of a bool; `stored` is None for an unknown user."""
+        return self._submit(_verify, password, self._dummy if stored is None else stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        parsed = _parse(stored)
+        return parsed is None or parsed[:3] != self.params
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,95 @@
+import json
+import zlib
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# Encodings of the plaintext inside the encrypted `data` field, negotiated
+# at /handshake. JSON is always available and the default; the binary ones
+# are offered only when their package is installed.
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+DEFAULT_ENCODING = "json"
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data).encode('utf-8')
+
+def _json_loads(raw: bytes) -> Any:
+    return json.loads(raw.decode('utf-8'))
+
+ENCODINGS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (_json_dumps, _json_loads),
+}
+if msgpack is not None:
+    ENCODINGS["msgpack"] = (msgpack.packb, lambda raw: msgpack.unpackb(raw, raw=False))
+if cbor2 is not None:
+    ENCODINGS["cbor"] = (cbor2.dumps, cbor2.loads)
+
+def negotiate(offered: Optional[Iterable[str]]) -> str:
+    """First encoding of the client's preference list the server supports."""
+    for name in offered or ():
+        if name in ENCODINGS:
+            return name
+    return DEFAULT_ENCODING
+
+def encode(data: Any, encoding: str = DEFAULT_ENCODING) -> bytes:
+    return ENCODINGS[encoding][0](data)
+
+def decode(raw: bytes, encoding: str = DEFAULT_ENCODING) -> Any:
+    return ENCODINGS[encoding][1](raw)
+
+# Compression of the encoded plaintext before encryption, also negotiated at
+# /handshake. Once a session uses it, every plaintext starts with a marker
+# byte telling whether the rest is compressed; payloads under the size
+# threshold (bid replies...) are sent as they are.
+#
+# Compressing data an attacker controls together with secrets in one
+# message leaks information through the size (CRIME/BREACH); the payloads of
+# this API are public auction data and the client's own requests.
+
+COMPRESSIONS = ("none", "zlib")
+DEFAULT_COMPRESSION = "none"
+
+RAW = b"\x00"
+ZLIB = b"\x01"
+
+class DecompressionError(ValueError):
+    pass
+
+def negotiate_compression(offered: Optional[Iterable[str]]) -> str:
+    for name in offered or ():
+        if name in COMPRESSIONS:
+            return name
+    return DEFAULT_COMPRESSION
+
+def compress(raw: bytes, compression: str, min_size: int = 1024, level: int = 6) -> bytes:
+    if compression == "none":
+        return raw
+    if len(raw) < min_size:
+        return RAW + raw
+    return ZLIB + zlib.compress(raw, level)
+
+def decompress(raw: bytes, compression: str, max_size: int = 1 << 20) -> bytes:
+    """Refuses anything inflating past `max_size` bytes."""
+    if compression == "none":
+        return raw
+    marker, body = raw[:1], raw[1:]
+    if marker == RAW:
+        return body
+    if marker != ZLIB:
+        raise DecompressionError("Unknown compression marker")
+    inflater = zlib.decompressobj()
+    try:
+        out = inflater.decompress(body, max_size)
+    except zlib.error as e:
+        raise DecompressionError(str(e))
+    if inflater.unconsumed_tail or not inflater.eof:
+        raise DecompressionError("Compressed payload too large or truncated")
+    return out
@@ -0,0 +1,63 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+class ExpiryScheduler:
+    """
+    Min-heap of (end_time, auction_id).
+
+    `run` sleeps until the earliest deadline (or until an earlier one is
+    scheduled) and hands every expired auction to `on_expire`, so an idle
+    server does no work between deadlines whatever the number of auctions.
+
+    An `on_expire` that fails is retried after `retry_delay` seconds,
+    doubling on each further failure up to `max_retry_delay`, so an auction
+    is not left open because its close hit a transient error (a failed
+    fsync, say).
+    """
+
+    retry_delay = 1.0
+    max_retry_delay = 60.0
+
+    def __init__(self, on_expire: Callable[[str], Awaitable[None]]):
+        self.on_expire = on_expire
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        # consecutive failures per auction
+        self._failures: Dict[str, int] = {}
+
+    def schedule(self, auction_id: str, end_time: float):
+        heapq.heappush(self._heap, (end_time, auction_id))
+        if self._heap[0][1] == auction_id:
+            self._wakeup.set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, auction_id = heapq.heappop(self._heap)
+            try:
+                await self.on_expire(auction_id)
+            except Exception as e:
+                failures = self._failures.get(auction_id, 0)
+                self._failures[auction_id] = failures + 1
+                delay = min(self.retry_delay * 2 ** failures, self.max_retry_delay)
+                print(f"Expiry error for {auction_id}, retrying in {delay:g}s: {e}")
+                self.schedule(auction_id, time.time() + delay)
+            else:
+                self._failures.pop(auction_id, None)
@@ -0,0 +1,86 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import uvicorn
+
+from eventbus import run_broker
+from keystore import SERVER_KEY_FILE, load_or_create_server_key
+
+# Launcher for the auction server.
+# usage: python serve.py [--workers N] [--port PORT] [--ssl-keyfile key.pem --ssl-certfile cert.pem]
+#
+# With more than one worker, every piece of state a request may need on
+# another worker has to live outside the process:
+# - the RSA key is created here once, before the workers start, and loaded by each of them
+# - sessions are kept in a shared SQLite database (SESSION_DB)
+# - WebSocket events are relayed between workers by a broker process (EVENT_BUS)
+# - auctions and users are kept in the SQLite storage (STORAGE=sqlite)
+
+# storage backends that can be shared between worker processes
+SHARED_STORAGE = {"sqlite"}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the auction server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--session-db", default=os.environ.get("SESSION_DB", "sessions.db"),
+                        help="SQLite file holding the sessions shared by the workers")
+    parser.add_argument("--event-bus", default=os.environ.get("EVENT_BUS"),
+                        help="Unix socket of the broker relaying WebSocket events between the workers")
+    parser.add_argument("--ssl-keyfile")
+    parser.add_argument("--ssl-certfile")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        storage = os.environ.get("STORAGE", "json")
+        if storage not in SHARED_STORAGE:
+            parser.error(f"--workers {args.workers}: the '{storage}' storage is owned by a single process, "
+                         "so workers would each keep their own copy of the auctions")
+    return args
+
+def start_broker(path: str, timeout: float = 5.0) -> multiprocessing.Process:
+    if os.path.exists(path):
+        os.unlink(path)
+    broker = multiprocessing.Process(target=run_broker, args=(path,), daemon=True)
+    broker.start()
+    # workers reconnect on their own, but events published before they do are not relayed
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return broker
+
+def main():
+    args = parse_args()
+
+    # generate the key once here rather than racing in every worker
+    load_or_create_server_key(SERVER_KEY_FILE)
+
+    broker = None
+    if args.workers > 1:
+        os.environ["SESSION_DB"] = args.session_db
+        path = args.event_bus or os.path.join(tempfile.gettempdir(), f"auction-events-{os.getpid()}.sock")
+        broker = start_broker(path)
+        os.environ["EVENT_BUS"] = path
+
+    try:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            ssl_keyfile=args.ssl_keyfile,
+            ssl_certfile=args.ssl_certfile,
+        )
+    finally:
+        if broker is not None:
+            broker.terminate()
+            broker.join()
+            if os.path.exists(path):
+                os.unlink(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+class Session:
+    """
+    State negotiated at /handshake, kept for the lifetime of the session so
+    requests do not redo any of it.
+    """
+
+    __slots__ = ("key", "encoding", "cipher", "compression", "created", "last_used", "keyed")
+
+    def __init__(self, key: bytes, encoding: str = "json", cipher: str = "cbc", compression: str = "none",
+                 created: Optional[float] = None, last_used: Optional[float] = None, keyed: bool = False):
+        # timestamps come from the clock of the store that owns the session
+        self.key = key
+        # encoding of the plaintext inside the encrypted payloads, see payloads.py
+        self.encoding = encoding
+        # cipher mode of the payloads, see ciphers.py
+        self.cipher = cipher
+        # compression applied before encryption, see payloads.py
+        self.compression = compression
+        self.created = time.monotonic() if created is None else created
+        self.last_used = self.created if last_used is None else last_used
+        # whether the session was handed the WebSocket broadcast key
+        self.keyed = keyed
+
+class SessionStore:
+    """
+    Sessions kept in least-recently-used order.
+
+    A session expires after `idle_ttl` seconds without a request or
+    `max_lifetime` seconds after the handshake, whichever comes first. When
+    `max_sessions` is reached the least recently used session is evicted.
+    Because the order is by last use, idle sessions are always at the front
+    and are purged lazily on every handshake.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl: float = 1800.0, max_lifetime: float = 43200.0):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_lifetime = max_lifetime
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        # eviction/expiry timestamps over the last minute
+        self._recent: Deque[float] = deque()
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return now - session.last_used > self.idle_ttl or now - session.created > self.max_lifetime
+
+    def _drop(self, now: float):
+        self._recent.append(now)
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+
+    def _purge(self, now: float):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+            self._drop(now)
+
+    def create(self, key: bytes, encoding: str = "json", cipher: str = "cbc", compression: str = "none") -> str:
+        session_id = str(uuid.uuid4())
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+                self._drop(now)
+            self._sessions[session_id] = Session(key, encoding, cipher, compression)
+            self.created += 1
+        return session_id
+
+    def get(self, session_id: Optional[str], touch: bool = True) -> Optional[Session]:
+        """With touch=False the lookup does not count as use of the session."""
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self._expired(session, now):
+                del self._sessions[session_id]
+                self.expired += 1
+                self._drop(now)
+                return None
+            if touch:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def revoke(self, session_id: Optional[str]) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def mark_keyed(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.keyed = True
+
+    def __contains__(self, session_id: Optional[str]) -> bool:
+        return self.get(session_id) is not None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            return {
+                "active": len(self._sessions),
+                "created": self.created,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "dropped_last_minute": len(self._recent)
+            }
+
+class SqliteSessionStore:
+    """
+    SessionStore kept in a SQLite database (WAL mode) so that every worker
+    process sees the sessions created by the others' handshakes. Same expiry
+    and eviction rules as SessionStore; last_used is only written back once
+    it is `touch_interval` seconds stale to keep requests read-only.
+
+    The database holds session keys: it is created readable by the owner only.
+    """
+
+    OPTION_COLUMNS = {
+        "encoding": "TEXT NOT NULL DEFAULT 'json'",
+        "cipher": "TEXT NOT NULL DEFAULT 'cbc'",
+        "compression": "TEXT NOT NULL DEFAULT 'none'",
+        "keyed": "INTEGER NOT NULL DEFAULT 0",
+    }
+
+    def __init__(self, path: str, max_sessions: int = 10000, idle_ttl: float = 1800.0,
+                 max_lifetime: float = 43200.0, touch_interval: Optional[float] = None):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_lifetime = max_lifetime
+        self.touch_interval = idle_ttl / 60 if touch_interval is None else touch_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        self._recent: Deque[float] = deque()
+
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, key BLOB NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        # negotiated options (and the keyed flag) added after the table was first created
+        existing = {row[1] for row in db.execute("PRAGMA table_info(sessions)")}
+        for column, definition in self.OPTION_COLUMNS.items():
+            if column not in existing:
+                try:
+                    db.execute(f"ALTER TABLE sessions ADD COLUMN {column} {definition}")
+                except sqlite3.OperationalError:
+                    # added meanwhile by another worker
+                    pass
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite3 connections are not shareable
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _drop(self, now: float, count: int):
+        with self._lock:
+            self._recent.extend([now] * count)
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+
+    def create(self, key: bytes, encoding: str = "json", cipher: str = "cbc", compression: str = "none") -> str:
+        session_id = str(uuid.uuid4())
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            expired = db.execute(
+                "DELETE FROM sessions WHERE last_used < ? OR created < ?",
+                (now - self.idle_ttl, now - self.max_lifetime)
+            ).rowcount
+            (count,) = db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            evicted = 0
+            if count >= self.max_sessions:
+                evicted = db.execute(
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_sessions + 1,)
+                ).rowcount
+            db.execute("INSERT INTO sessions (id, key, created, last_used, encoding, cipher, compression)"
+                       " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (session_id, key, now, now, encoding, cipher, compression))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.created += 1
+            self.expired += expired
+            self.evicted += evicted
+        if expired or evicted:
+            self._drop(now, expired + evicted)
+        return session_id
+
+    def get(self, session_id: Optional[str], touch: bool = True) -> Optional[Session]:
+        if not session_id:
+            return None
+        now = time.time()
+        db = self._db()
+        row = db.execute("SELECT key, encoding, cipher, compression, created, last_used, keyed FROM sessions WHERE id = ?",
+                         (session_id,)).fetchone()
+        if row is None:
+            return None
+        key, encoding, cipher, compression, created, last_used, keyed = row
+        if now - last_used > self.idle_ttl or now - created > self.max_lifetime:
+            if db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount:
+                with self._lock:
+                    self.expired += 1
+                self._drop(now, 1)
+            return None
+        if touch and now - last_used > self.touch_interval:
+            db.execute("UPDATE sessions SET last_used = ? WHERE id = ?", (now, session_id))
+            last_used = now
+        return Session(key, encoding, cipher, compression, created, last_used, bool(keyed))
+
+    def revoke(self, session_id: Optional[str]) -> bool:
+        if not session_id:
+            return False
+        return self._db().execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def mark_keyed(self, session_id: str):
+        self._db().execute("UPDATE sessions SET keyed = 1 WHERE id = ?", (session_id,))
+
+    def __contains__(self, session_id: Optional[str]) -> bool:
+        return self.get(session_id) is not None
+
+    def stats(self) -> dict:
+        (active,) = self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()
+        now = time.time()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            # counters are per worker process, "active" is shared
+            return {
+                "active": active,
+                "created": self.created,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "dropped_last_minute": len(self._recent)
+            }
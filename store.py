@@ -0,0 +1,974 @@
+import bisect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+#Errors
+
+class StoreError(Exception):
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+class NotFound(StoreError):
+    pass
+
+class Rejected(StoreError):
+    pass
+
+#Batches
+
+def _settle(outcomes: List[Any]) -> Future:
+    """Future of `outcomes`, once the Futures among them resolved, with their results in their place."""
+    settled: Future = Future()
+    pending = [o for o in outcomes if isinstance(o, Future)]
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            settled.set_result([o.result() if isinstance(o, Future) else o for o in outcomes])
+        except Exception as e:
+            settled.set_exception(e)
+
+    if not pending:
+        settled.set_result(outcomes)
+    for fut in pending:
+        fut.add_done_callback(done)
+    return settled
+
+#Store
+
+class AuctionStore:
+    """
+    Process-wide in-memory copy of data.json.
+
+    Every read is served from memory. Each mutation is applied in memory and
+    appended to a journal (one JSON record per line) by a background writer
+    thread. Records queued while the writer is busy go out together and share
+    a single fsync (group commit). Once the journal grows past `compact_every`
+    records, or every `compact_interval` seconds, the writer folds it into a
+    new data.json snapshot and truncates it. The snapshot is copied a chunk
+    at a time and serialized outside the lock, and a failed compaction is reported and retried later
+    while journaling carries on. On startup the snapshot is loaded and the
+    journal replayed on top of it.
+
+    Mutating methods return a Future resolved once the change is durable.
+    A journal write that fails is cut back out of the file and retried, so
+    no later change is acknowledged ahead of it.
+
+    Auctions are stored with an absolute `end_time`; `time_remaining` is
+    derived from it whenever an auction is read.
+
+    Auctions and users are also indexed by id and username, and the indexes
+    are updated by `_apply` together with the lists they point into. Auctions
+    are further indexed by seller and by open status for filtered listings.
+
+    Every auction carries the journal sequence number of the record that
+    last changed it as its `version`, and a recently-changed list lets
+    `changes_since` skip untouched auctions. The store version is the latest
+    of these: records about users do not advance it, so they do not
+    invalidate cached listings.
+
+    Bids and closes on one auction are serialized by that auction's stripe
+    lock, so they are linearizable, while bids on auctions in other stripes
+    only meet on the short global lock around the journal append.
+    """
+
+    # backoff of journal writes that fail
+    retry_delay = 0.1
+    max_retry_delay = 5.0
+    # records copied per hold of the lock, and serialized per call, while snapshotting
+    snapshot_chunk = 1000
+
+    def __init__(self, path: str, journal_path: Optional[str] = None,
+                 compact_every: int = 1000, compact_interval: float = 60.0,
+                 lock_stripes: int = 64):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + ".journal"
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+
+        self._lock = threading.RLock()
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+        self._depth_lock = threading.Lock()
+        self._bid_depth: Dict[str, int] = {}
+        self._auctions_by_id: Dict[str, dict] = {}
+        self._users_by_name: Dict[str, dict] = {}
+        # position of each auction in the auctions list, used as pagination cursor
+        self._positions: Dict[str, int] = {}
+        self._by_seller: Dict[str, List[dict]] = {}
+        # insertion ordered, so iteration follows creation order
+        self._open: Dict[str, dict] = {}
+        # least to most recently changed
+        self._changed: "OrderedDict[str, dict]" = OrderedDict()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue: List[Tuple[dict, Future, Any]] = []
+        self._closed = False
+
+        self._seq, journal_size = self._recover()
+        # unbuffered, so a failed write leaves nothing behind to be flushed later
+        self._journal = open(self.journal_path, "ab", buffering=0)
+        self._journal_records = journal_size
+        self._last_compaction = time.monotonic()
+        # a failed compaction is retried compact_interval seconds later
+        self._compaction_retry = 0.0
+        if self._migrated:
+            # written back at once, or legacy countdowns would restart from
+            # their full time_remaining on every start
+            self._compact_now()
+
+        self._writer = threading.Thread(target=self._persist_loop, name="store-writer", daemon=True)
+        self._writer.start()
+
+    #Recovery
+
+    def _recover(self) -> Tuple[int, int]:
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        else:
+            data = {"users": [], "auctions": []}
+        self._data = data
+        seq = data.pop("seq", 0)
+        self._migrated = any(self._is_legacy(a) for a in data["auctions"])
+        for position, auction in enumerate(data["auctions"]):
+            self._migrate_auction(auction)
+            self._index_auction(auction, position)
+        for auction in sorted(data["auctions"], key=lambda a: a["version"]):
+            self._changed[auction["id"]] = auction
+        # advanced by _apply while the journal is replayed
+        self._version = max((a["version"] for a in data["auctions"]), default=0)
+        for user in data["users"]:
+            self._users_by_name[user["username"]] = user
+        replayed = 0
+
+        if os.path.exists(self.journal_path):
+            good_offset = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn write from a crash: everything after it is discarded
+                        break
+                    good_offset += len(line)
+                    replayed += 1
+                    if record["seq"] > seq:
+                        if record["op"] == "auction_created" and self._is_legacy(record["auction"]):
+                            self._migrated = True
+                        self._apply(record)
+                        seq = record["seq"]
+            if good_offset != os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good_offset)
+
+        return seq, replayed
+
+    #Journal
+
+    def _apply(self, record: dict) -> dict:
+        # returns a copy of the user or auction the record touched
+        op = record["op"]
+        if op == "user_registered":
+            target = dict(record["user"])
+            self._data["users"].append(target)
+            self._users_by_name[target["username"]] = target
+        elif op == "password_changed":
+            target = self._users_by_name[record["username"]]
+            target["password"] = record["password"]
+        elif op == "auction_created":
+            target = self._migrate_auction(dict(record["auction"]))
+            self._index_auction(target, len(self._data["auctions"]))
+            self._data["auctions"].append(target)
+        elif op == "bid_accepted":
+            target = self._find_auction(record["id"])
+            target["highest_bid"] = record["amount"]
+            target["highest_bidder"] = record["bidder"]
+        elif op == "auction_closed":
+            target = self._find_auction(record["id"])
+            target["status"] = "closed"
+            self._open.pop(target["id"], None)
+        else:
+            raise ValueError(f"Unknown journal record: {op}")
+        if op not in ("user_registered", "password_changed"):
+            target["version"] = self._version = record["seq"]
+            self._changed[target["id"]] = target
+            self._changed.move_to_end(target["id"])
+        return target
+
+    def _commit(self, record: dict) -> Future:
+        # caller holds the lock
+        self._seq += 1
+        record["seq"] = self._seq
+        result = self._view(self._apply(record))
+        fut: Future = Future()
+        self._queue.append((record, fut, result))
+        self._wakeup.notify()
+        return fut
+
+    def _compaction_due(self, pending: int = 0) -> bool:
+        records = self._journal_records + pending
+        if records == 0:
+            return False
+        now = time.monotonic()
+        if now < self._compaction_retry:
+            return False
+        if records >= self.compact_every:
+            return True
+        return now - self._last_compaction >= self.compact_interval
+
+    def _snapshot(self) -> dict:
+        """
+        Copy of the data as of the current seq, taken `snapshot_chunk`
+        records at a time so bids never wait on the whole copy. A record
+        changed between two chunks may be copied with changes made after
+        `seq`; those are journaled after `seq`, and replaying them over the
+        snapshot sets the same fields to the same values again. Records only
+        hold scalars, so copying each one is enough to serialize it after
+        the lock is released.
+        """
+        with self._lock:
+            snapshot = {k: v for k, v in self._data.items() if k not in ("users", "auctions")}
+            snapshot["seq"] = self._seq
+            # created later, so not covered by seq
+            counts = {name: len(self._data[name]) for name in ("users", "auctions")}
+        for name, count in counts.items():
+            records = snapshot[name] = []
+            for start in range(0, count, self.snapshot_chunk):
+                with self._lock:
+                    records.extend(dict(r) for r in self._data[name][start:min(start + self.snapshot_chunk, count)])
+        return snapshot
+
+    def _persist_loop(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed and not self._compaction_due():
+                    self._wakeup.wait(self.compact_interval)
+                batch, self._queue = self._queue, []
+                compact = self._compaction_due(len(batch)) or (self._closed and self._journal_records + len(batch))
+                closing = self._closed
+
+            if batch:
+                self._append(batch)
+            if compact:
+                # records after this batch are still queued, so the journal
+                # can be truncated whatever seq the snapshot ends up at
+                self._compact_now()
+            if closing:
+                self._journal.close()
+                return
+
+    def _append(self, batch: List[Tuple[dict, Future, Any]]):
+        # the records are already applied in memory and later ones build on
+        # them: the batch is retried until it is durable, and nothing queued
+        # after it is acknowledged before
+        data = "".join(json.dumps(record) + "\n" for record, _, _ in batch).encode()
+        offset = self._journal.tell()
+        delay = self.retry_delay
+        while True:
+            try:
+                # drops whatever a failed attempt left, a torn line included
+                self._journal.truncate(offset)
+                written = 0
+                while written < len(data):
+                    written += self._journal.write(data[written:])
+                os.fsync(self._journal.fileno())
+                break
+            except Exception as e:
+                print(f"Journal write error, retrying in {delay:g}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        self._journal_records += len(batch)
+        for _, fut, result in batch:
+            fut.set_result(result)
+
+    def _compact_now(self):
+        try:
+            self._compact(self._serialize(self._snapshot()))
+        except Exception as e:
+            # the journal still holds every record: keep appending to it
+            print(f"Compaction error: {e}")
+            self._compaction_retry = time.monotonic() + self.compact_interval
+
+    def _serialize(self, snapshot: dict) -> Iterator[str]:
+        # a chunk per json.dumps call: the C encoder holds the GIL for a whole
+        # call, which would stall the event loop on a large store
+        for i, (key, value) in enumerate(snapshot.items()):
+            yield ("{" if i == 0 else ", ") + json.dumps(key) + ": "
+            if key not in ("users", "auctions"):
+                yield json.dumps(value)
+                continue
+            yield "["
+            for start in range(0, len(value), self.snapshot_chunk):
+                yield (", " if start else "") + json.dumps(value[start:start + self.snapshot_chunk])[1:-1]
+            yield "]"
+        yield "}"
+
+    def _compact(self, snapshot: Iterable[str]):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._fsync_dir()
+        # the snapshot now covers the whole journal
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        os.fsync(self._journal.fileno())
+        self._journal_records = 0
+        self._last_compaction = time.monotonic()
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+
+    #Users
+
+    def find_user(self, username: str) -> Optional[dict]:
+        with self._lock:
+            u = self._users_by_name.get(username)
+            return dict(u) if u is not None else None
+
+    def add_user(self, user: dict) -> Future:
+        with self._lock:
+            if user["username"] in self._users_by_name:
+                raise Rejected("Username already exists")
+            return self._commit({"op": "user_registered", "user": dict(user)})
+
+    def set_password(self, username: str, password: str) -> Future:
+        with self._lock:
+            if username not in self._users_by_name:
+                raise NotFound("User not found")
+            return self._commit({"op": "password_changed", "username": username, "password": password})
+
+    #Auctions
+
+    @staticmethod
+    def _is_legacy(auction: dict) -> bool:
+        return "end_time" not in auction or "time_remaining" in auction
+
+    @staticmethod
+    def _migrate_auction(auction: dict) -> dict:
+        # records written before end_time existed only carry a countdown
+        if "end_time" not in auction:
+            now = time.time()
+            auction.setdefault("start_time", now)
+            auction["end_time"] = now + auction.get("time_remaining", 0)
+        auction.pop("time_remaining", None)
+        auction.setdefault("version", 0)
+        return auction
+
+    @staticmethod
+    def _view(item: dict) -> dict:
+        view = dict(item)
+        if "end_time" in item:
+            if item["status"] == "open":
+                view["time_remaining"] = max(0, math.ceil(item["end_time"] - time.time()))
+            else:
+                view["time_remaining"] = 0
+        return view
+
+    def _index_auction(self, auction: dict, position: int):
+        self._auctions_by_id[auction["id"]] = auction
+        self._positions[auction["id"]] = position
+        self._by_seller.setdefault(auction["seller"], []).append(auction)
+        if auction["status"] == "open":
+            self._open[auction["id"]] = auction
+
+    def _find_auction(self, auction_id: str) -> Optional[dict]:
+        return self._auctions_by_id.get(auction_id)
+
+    @staticmethod
+    def _from(items: List[dict], start: int) -> Iterable[dict]:
+        # neither copies the tail like a slice nor steps through the head like islice
+        return map(items.__getitem__, range(start, len(items)))
+
+    def list_auctions(self, status: Optional[str] = None, seller: Optional[str] = None,
+                      cursor: int = 0, limit: Optional[int] = None,
+                      fields: Optional[Iterable[str]] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Auctions in creation order, starting at position `cursor`.
+        Returns the page and the cursor of the next one (None on the last page).
+        """
+        with self._lock:
+            if seller is not None:
+                candidates = self._by_seller.get(seller, [])
+                start = bisect.bisect_left(candidates, cursor, key=lambda a: self._positions[a["id"]])
+                candidates = self._from(candidates, start)
+            elif status == "open":
+                candidates = (a for a in self._open.values() if self._positions[a["id"]] >= cursor)
+            else:
+                candidates = self._from(self._data["auctions"], cursor)
+
+            page = []
+            next_cursor = None
+            for auction in candidates:
+                if status is not None and auction["status"] != status:
+                    continue
+                if limit is not None and len(page) >= limit:
+                    next_cursor = self._positions[auction["id"]]
+                    break
+                page.append(auction)
+
+            views = [self._view(a) for a in page]
+
+        if fields is not None:
+            keep = set(fields) | {"id"}
+            views = [{k: v for k, v in a.items() if k in keep} for a in views]
+        return views, next_cursor
+
+    def get_auction(self, auction_id: str) -> dict:
+        with self._lock:
+            auction = self._find_auction(auction_id)
+            if auction is None:
+                raise NotFound("Auction not found")
+            return self._view(auction)
+
+    def auction_version(self, auction_id: str) -> Tuple[int, str]:
+        """Version and status of one auction, without copying it."""
+        with self._lock:
+            auction = self._find_auction(auction_id)
+            if auction is None:
+                raise NotFound("Auction not found")
+            return auction["version"], auction["status"]
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def changes_since(self, version: int) -> Tuple[List[dict], int]:
+        """Auctions changed after `version`, oldest change first, and the current version."""
+        with self._lock:
+            changed = []
+            for auction in reversed(self._changed.values()):
+                if auction["version"] <= version:
+                    break
+                changed.append(self._view(auction))
+            changed.reverse()
+            return changed, self._version
+
+    def open_deadlines(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return [(a["id"], a["end_time"]) for a in self._data["auctions"] if a["status"] == "open"]
+
+    def create_auction(self, auction: dict) -> Future:
+        with self._lock:
+            if auction["id"] in self._auctions_by_id:
+                raise Rejected("Auction ID already exists")
+            return self._commit({"op": "auction_created", "auction": dict(auction)})
+
+    def _stripe(self, auction_id: str) -> threading.Lock:
+        return self._stripes[hash(auction_id) % len(self._stripes)]
+
+    def _enter_bid(self, auction_id: str):
+        with self._depth_lock:
+            self._bid_depth[auction_id] = self._bid_depth.get(auction_id, 0) + 1
+
+    def _leave_bid(self, auction_id: str):
+        with self._depth_lock:
+            depth = self._bid_depth[auction_id] - 1
+            if depth:
+                self._bid_depth[auction_id] = depth
+            else:
+                del self._bid_depth[auction_id]
+
+    def bid_queue_depths(self) -> Dict[str, int]:
+        """Bids currently in flight (waiting, validating or being made durable) per auction."""
+        with self._depth_lock:
+            return dict(self._bid_depth)
+
+    @staticmethod
+    def _check_bid(auction: Optional[dict], amount: int):
+        if auction is None:
+            raise NotFound("Auction not found")
+        if auction["status"] != "open":
+            raise Rejected("Auction is closed")
+        if auction["end_time"] <= time.time():
+            raise Rejected("Auction time expired")
+        if amount <= auction["highest_bid"]:
+            raise Rejected("Bid too low")
+
+    def place_bid(self, auction_id: str, bidder: str, amount: int) -> Future:
+        self._enter_bid(auction_id)
+        try:
+            with self._stripe(auction_id):
+                with self._lock:
+                    auction = self._find_auction(auction_id)
+                self._check_bid(auction, amount)
+
+                with self._lock:
+                    fut = self._commit({"op": "bid_accepted", "id": auction_id, "bidder": bidder, "amount": amount})
+        except StoreError:
+            self._leave_bid(auction_id)
+            raise
+        fut.add_done_callback(lambda _: self._leave_bid(auction_id))
+        return fut
+
+    def close_auction(self, auction_id: str) -> Future:
+        with self._stripe(auction_id):
+            with self._lock:
+                auction = self._find_auction(auction_id)
+                if auction is None:
+                    raise NotFound("Auction not found")
+                if auction["status"] != "open":
+                    raise Rejected("Auction is closed")
+                return self._commit({"op": "auction_closed", "id": auction_id})
+
+    def batch(self, operations: List[tuple]) -> Future:
+        """
+        Runs operations in order as one step: no other change lands between
+        them and each sees the ones before it. An operation is
+        ("get", auction_id), ("bid", auction_id, bidder, amount) or
+        ("create", auction). Returns a Future of the outcomes in the same
+        order, each the auction or the StoreError it was refused with,
+        resolved once every change is durable.
+        """
+        bids = [op[1] for op in operations if op[0] == "bid"]
+        # stripes taken in index order, as a single place_bid never holds two
+        stripes = sorted({hash(auction_id) % len(self._stripes) for auction_id in bids})
+        for auction_id in bids:
+            self._enter_bid(auction_id)
+        outcomes: List[Any] = []
+        try:
+            with ExitStack() as stack:
+                for i in stripes:
+                    stack.enter_context(self._stripes[i])
+                with self._lock:
+                    for op in operations:
+                        try:
+                            outcomes.append(self._batch_op(op))
+                        except StoreError as e:
+                            outcomes.append(e)
+        except BaseException:
+            for auction_id in bids:
+                self._leave_bid(auction_id)
+            raise
+        fut = _settle(outcomes)
+        fut.add_done_callback(lambda _: [self._leave_bid(auction_id) for auction_id in bids])
+        return fut
+
+    def _batch_op(self, op: tuple) -> Any:
+        # caller holds the stripes of the bids and the lock
+        if op[0] == "get":
+            return self.get_auction(op[1])
+        if op[0] == "bid":
+            _, auction_id, bidder, amount = op
+            self._check_bid(self._find_auction(auction_id), amount)
+            return self._commit({"op": "bid_accepted", "id": auction_id, "bidder": bidder, "amount": amount})
+        if op[0] == "create":
+            return self.create_auction(op[1])
+        raise Rejected("Unknown operation")
+
+#SQLite
+
+AUCTION_COLUMNS = ("id", "item", "description", "seller", "highest_bid", "highest_bidder",
+                   "status", "start_time", "end_time", "version")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)",
+    "CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT NOT NULL)",
+    # position is the pagination cursor, as the list index is for AuctionStore
+    "CREATE TABLE IF NOT EXISTS auctions ("
+    " position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, item TEXT, description TEXT,"
+    " seller TEXT, highest_bid INTEGER NOT NULL, highest_bidder TEXT, status TEXT NOT NULL,"
+    " start_time REAL, end_time REAL NOT NULL, version INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS auctions_seller ON auctions (seller, position)",
+    "CREATE INDEX IF NOT EXISTS auctions_status ON auctions (status, position)",
+    "CREATE INDEX IF NOT EXISTS auctions_version ON auctions (version)",
+    "CREATE TABLE IF NOT EXISTS bids ("
+    " id INTEGER PRIMARY KEY, auction_id TEXT NOT NULL, bidder TEXT NOT NULL,"
+    " amount INTEGER NOT NULL, time REAL NOT NULL, version INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS bids_auction ON bids (auction_id, id)",
+)
+
+# SQLite integers are 64-bit
+MAX_AMOUNT = 2 ** 63 - 1
+
+class SqliteAuctionStore:
+    """
+    AuctionStore kept in a SQLite database (WAL mode) instead of memory, so
+    that several worker processes can share it and startup does not load the
+    whole catalogue. Every lookup goes through an index (auction id, seller,
+    status, version, username).
+
+    Mutations are run by a writer thread: the operations queued while it is
+    busy share one transaction and one fsync (group commit), and their
+    Futures resolve once it is committed. Validation happens inside that
+    transaction, so a StoreError is raised through the Future.
+
+    Bids and closes are compare-and-set updates (`... WHERE status = 'open'
+    AND highest_bid < ?`): when several workers race on the same auction,
+    only one bid per amount is accepted and only one close succeeds, so END
+    is broadcast once.
+
+    The store version is a counter in the meta table bumped by every auction
+    change, shared by all the processes using the database.
+
+    With `migrate_from`, an empty database is filled once from that
+    data.json (and its journal).
+    """
+
+    def __init__(self, path: str, migrate_from: Optional[str] = None, busy_timeout: float = 30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._depth_lock = threading.Lock()
+        self._bid_depth: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue: List[Tuple[Any, tuple, Future]] = []
+        self._closed = False
+
+        self._setup(migrate_from)
+
+        self._writer = threading.Thread(target=self._write_loop, name="store-writer", daemon=True)
+        self._writer.start()
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite3 connections are not shareable
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.execute("PRAGMA synchronous=FULL")
+            self._local.db = db
+        return db
+
+    #Setup
+
+    def _setup(self, migrate_from: Optional[str]):
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        # workers starting together wait here while the first one migrates
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in SCHEMA:
+                db.execute(statement)
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+            (auctions,) = db.execute("SELECT COUNT(*) FROM (SELECT 1 FROM auctions LIMIT 1)").fetchone()
+            (users,) = db.execute("SELECT COUNT(*) FROM (SELECT 1 FROM users LIMIT 1)").fetchone()
+            if migrate_from and not auctions and not users and os.path.exists(migrate_from):
+                self._migrate(db, migrate_from)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _migrate(self, db: sqlite3.Connection, json_path: str):
+        # AuctionStore replays the journal and upgrades old records on load
+        legacy = AuctionStore(json_path)
+        try:
+            with legacy._lock:
+                users = [(u["username"], u["password"]) for u in legacy._data["users"]]
+                auctions = [tuple(a.get(c) for c in AUCTION_COLUMNS) for a in legacy._data["auctions"]]
+                version = legacy.version
+        finally:
+            legacy.close()
+        db.executemany("INSERT INTO users VALUES (?, ?)", users)
+        db.executemany(
+            f"INSERT INTO auctions (position, {', '.join(AUCTION_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(AUCTION_COLUMNS) + 1))})",
+            [(position,) + auction for position, auction in enumerate(auctions)]
+        )
+        db.execute("UPDATE meta SET value = ? WHERE key = 'version'", (version,))
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('migrated_from', ?)", (os.path.abspath(json_path),))
+
+    #Writer
+
+    def _submit(self, op, *args) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Store is closed")
+            self._queue.append((op, args, fut))
+            self._wakeup.notify()
+        return fut
+
+    def _write_loop(self):
+        db = self._db()
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._wakeup.wait()
+                batch, self._queue = self._queue, []
+                closing = self._closed
+            if batch:
+                self._run(db, batch)
+            if closing:
+                db.close()
+                return
+
+    def _run(self, db: sqlite3.Connection, batch: List[Tuple[Any, tuple, Future]]):
+        # operations check before they write, so a rejected one leaves nothing to undo
+        outcomes = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for op, args, _ in batch:
+                    try:
+                        outcomes.append((op(db, *args), None))
+                    except StoreError as e:
+                        outcomes.append((None, e))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            for _, _, fut in batch:
+                fut.set_exception(e)
+            return
+        for (_, _, fut), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    @staticmethod
+    def _next_version(db: sqlite3.Connection) -> int:
+        (version,) = db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version' RETURNING value").fetchone()
+        return version
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+
+    #Users
+
+    def find_user(self, username: str) -> Optional[dict]:
+        row = self._db().execute("SELECT username, password FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        return {"username": row[0], "password": row[1]}
+
+    def add_user(self, user: dict) -> Future:
+        return self._submit(self._add_user, user["username"], user["password"])
+
+    @staticmethod
+    def _add_user(db: sqlite3.Connection, username: str, password: str) -> dict:
+        if db.execute("INSERT OR IGNORE INTO users VALUES (?, ?)", (username, password)).rowcount == 0:
+            raise Rejected("Username already exists")
+        return {"username": username, "password": password}
+
+    def set_password(self, username: str, password: str) -> Future:
+        return self._submit(self._set_password, username, password)
+
+    @staticmethod
+    def _set_password(db: sqlite3.Connection, username: str, password: str) -> dict:
+        if db.execute("UPDATE users SET password = ? WHERE username = ?", (password, username)).rowcount == 0:
+            raise NotFound("User not found")
+        return {"username": username, "password": password}
+
+    #Auctions
+
+    @staticmethod
+    def _row(row: tuple) -> dict:
+        return AuctionStore._view(dict(zip(AUCTION_COLUMNS, row)))
+
+    def _select(self, where: str, params: tuple, suffix: str = "") -> List[tuple]:
+        return self._db().execute(
+            f"SELECT position, {', '.join(AUCTION_COLUMNS)} FROM auctions WHERE {where} {suffix}", params
+        ).fetchall()
+
+    def list_auctions(self, status: Optional[str] = None, seller: Optional[str] = None,
+                      cursor: int = 0, limit: Optional[int] = None,
+                      fields: Optional[Iterable[str]] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Auctions in creation order, starting at position `cursor`.
+        Returns the page and the cursor of the next one (None on the last page).
+        """
+        where, params = ["position >= ?"], [cursor]
+        if seller is not None:
+            where.append("seller = ?")
+            params.append(seller)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        suffix = "ORDER BY position"
+        if limit is not None:
+            # one extra row tells whether there is a next page
+            suffix += " LIMIT ?"
+            params.append(limit + 1)
+        rows = self._select(" AND ".join(where), tuple(params), suffix)
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            next_cursor = rows[limit][0]
+            rows = rows[:limit]
+        views = [self._row(row[1:]) for row in rows]
+
+        if fields is not None:
+            keep = set(fields) | {"id"}
+            views = [{k: v for k, v in a.items() if k in keep} for a in views]
+        return views, next_cursor
+
+    def get_auction(self, auction_id: str) -> dict:
+        rows = self._select("id = ?", (auction_id,))
+        if not rows:
+            raise NotFound("Auction not found")
+        return self._row(rows[0][1:])
+
+    def auction_version(self, auction_id: str) -> Tuple[int, str]:
+        """Version and status of one auction, without copying it."""
+        row = self._db().execute("SELECT version, status FROM auctions WHERE id = ?", (auction_id,)).fetchone()
+        if row is None:
+            raise NotFound("Auction not found")
+        return row[0], row[1]
+
+    @property
+    def version(self) -> int:
+        (version,) = self._db().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return version
+
+    def changes_since(self, version: int) -> Tuple[List[dict], int]:
+        """Auctions changed after `version`, oldest change first, and the current version."""
+        db = self._db()
+        # one read transaction so the list and the version agree
+        db.execute("BEGIN")
+        try:
+            rows = self._select("version > ?", (version,), "ORDER BY version")
+            current = self.version
+        finally:
+            db.execute("COMMIT")
+        return [self._row(row[1:]) for row in rows], current
+
+    def open_deadlines(self) -> List[Tuple[str, float]]:
+        return self._db().execute("SELECT id, end_time FROM auctions WHERE status = 'open'").fetchall()
+
+    def create_auction(self, auction: dict) -> Future:
+        return self._submit(self._create_auction, dict(auction))
+
+    def _create_auction(self, db: sqlite3.Connection, auction: dict) -> dict:
+        if db.execute("SELECT 1 FROM auctions WHERE id = ?", (auction["id"],)).fetchone():
+            raise Rejected("Auction ID already exists")
+        if abs(auction["highest_bid"]) > MAX_AMOUNT:
+            raise Rejected("Price too high")
+        auction["version"] = self._next_version(db)
+        db.execute(
+            f"INSERT INTO auctions (position, {', '.join(AUCTION_COLUMNS)}) "
+            f"VALUES ((SELECT COALESCE(MAX(position) + 1, 0) FROM auctions), {', '.join('?' * len(AUCTION_COLUMNS))})",
+            tuple(auction.get(c) for c in AUCTION_COLUMNS)
+        )
+        return AuctionStore._view(auction)
+
+    def _enter_bid(self, auction_id: str):
+        with self._depth_lock:
+            self._bid_depth[auction_id] = self._bid_depth.get(auction_id, 0) + 1
+
+    def _leave_bid(self, auction_id: str):
+        with self._depth_lock:
+            depth = self._bid_depth[auction_id] - 1
+            if depth:
+                self._bid_depth[auction_id] = depth
+            else:
+                del self._bid_depth[auction_id]
+
+    def bid_queue_depths(self) -> Dict[str, int]:
+        """Bids currently in flight in this process (queued or being committed) per auction."""
+        with self._depth_lock:
+            return dict(self._bid_depth)
+
+    def place_bid(self, auction_id: str, bidder: str, amount: int) -> Future:
+        self._enter_bid(auction_id)
+        fut = self._submit(self._place_bid, auction_id, bidder, amount)
+        fut.add_done_callback(lambda _: self._leave_bid(auction_id))
+        return fut
+
+    def _place_bid(self, db: sqlite3.Connection, auction_id: str, bidder: str, amount: int) -> dict:
+        if abs(amount) > MAX_AMOUNT:
+            raise Rejected("Bid too high")
+        now = time.time()
+        row = db.execute(
+            f"UPDATE auctions SET highest_bid = ?, highest_bidder = ?,"
+            f" version = (SELECT value + 1 FROM meta WHERE key = 'version')"
+            f" WHERE id = ? AND status = 'open' AND end_time > ? AND highest_bid < ?"
+            f" RETURNING {', '.join(AUCTION_COLUMNS)}",
+            (amount, bidder, auction_id, now, amount)
+        ).fetchone()
+        if row is None:
+            current = db.execute("SELECT status, end_time FROM auctions WHERE id = ?", (auction_id,)).fetchone()
+            if current is None:
+                raise NotFound("Auction not found")
+            if current[0] != "open":
+                raise Rejected("Auction is closed")
+            if current[1] <= now:
+                raise Rejected("Auction time expired")
+            raise Rejected("Bid too low")
+        version = self._next_version(db)
+        db.execute("INSERT INTO bids (auction_id, bidder, amount, time, version) VALUES (?, ?, ?, ?, ?)",
+                   (auction_id, bidder, amount, now, version))
+        return self._row(row)
+
+    def close_auction(self, auction_id: str) -> Future:
+        return self._submit(self._close_auction, auction_id)
+
+    def _close_auction(self, db: sqlite3.Connection, auction_id: str) -> dict:
+        row = db.execute(
+            f"UPDATE auctions SET status = 'closed', version = (SELECT value + 1 FROM meta WHERE key = 'version')"
+            f" WHERE id = ? AND status = 'open' RETURNING {', '.join(AUCTION_COLUMNS)}",
+            (auction_id,)
+        ).fetchone()
+        if row is None:
+            if db.execute("SELECT 1 FROM auctions WHERE id = ?", (auction_id,)).fetchone() is None:
+                raise NotFound("Auction not found")
+            raise Rejected("Auction is closed")
+        self._next_version(db)
+        return self._row(row)
+
+    def batch(self, operations: List[tuple]) -> Future:
+        """Same operations and outcomes as AuctionStore.batch, run as one writer transaction step."""
+        bids = [op[1] for op in operations if op[0] == "bid"]
+        for auction_id in bids:
+            self._enter_bid(auction_id)
+        try:
+            fut = self._submit(self._batch, list(operations))
+        except BaseException:
+            for auction_id in bids:
+                self._leave_bid(auction_id)
+            raise
+        fut.add_done_callback(lambda _: [self._leave_bid(auction_id) for auction_id in bids])
+        return fut
+
+    def _batch(self, db: sqlite3.Connection, operations: List[tuple]) -> List[Any]:
+        outcomes: List[Any] = []
+        for op in operations:
+            try:
+                if op[0] == "get":
+                    # the writer thread's connection is db, so this reads inside the transaction
+                    outcomes.append(self.get_auction(op[1]))
+                elif op[0] == "bid":
+                    outcomes.append(self._place_bid(db, *op[1:]))
+                elif op[0] == "create":
+                    outcomes.append(self._create_auction(db, dict(op[1])))
+                else:
+                    raise Rejected("Unknown operation")
+            except StoreError as e:
+                outcomes.append(e)
+        return outcomes
@@ -1,7 +1,9 @@
 import requests
 import json
 import base64
+import sys
 import time
+import zlib
 from Crypto.PublicKey import RSA
 from Crypto.Cipher import AES, PKCS1_v1_5
 from Crypto.Util.Padding import pad, unpad
@@ -11,25 +13,58 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 BASE_URL = "https://localhost:8000"
 
+# --- Payload Encodings ---
+
+ENCODINGS = {
+    "json": (lambda data: json.dumps(data).encode('utf-8'), lambda raw: json.loads(raw.decode('utf-8'))),
+}
+try:
+    import msgpack
+    ENCODINGS["msgpack"] = (msgpack.packb, lambda raw: msgpack.unpackb(raw, raw=False))
+except ImportError:
+    pass
+try:
+    import cbor2
+    ENCODINGS["cbor"] = (cbor2.dumps, cbor2.loads)
+except ImportError:
+    pass
+
 # --- Security Helpers ---
 
-def encrypt_data(data, aes_key):
-    json_str = json.dumps(data)
+def encrypt_data(data, aes_key, encoding="json", mode="cbc", compression="none"):
+    plaintext = ENCODINGS[encoding][0](data)
+    if compression == "zlib":
+        # marker byte: 0x00 as it is, 0x01 zlib
+        plaintext = b"\x01" + zlib.compress(plaintext) if len(plaintext) >= 1024 else b"\x00" + plaintext
+    if mode == "gcm":
+        # nonce + ciphertext + tag, requests are authenticated with b"request"
+        nonce = get_random_bytes(12)
+        cipher = AES.new(aes_key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(b"request")
+        ct, tag = cipher.encrypt_and_digest(plaintext)
+        return base64.b64encode(nonce + ct + tag).decode('utf-8')
     iv = get_random_bytes(16)
     cipher = AES.new(aes_key, AES.MODE_CBC, iv)
-    ct = cipher.encrypt(pad(json_str.encode('utf-8'), AES.block_size))
+    ct = cipher.encrypt(pad(plaintext, AES.block_size))
     return base64.b64encode(iv + ct).decode('utf-8')
 
-def decrypt_data(encrypted_b64, aes_key):
+def decrypt_data(encrypted_b64, aes_key, encoding="json", mode="cbc", compression="none"):
     encrypted_data = base64.b64decode(encrypted_b64)
-    iv = encrypted_data[:16]
-    ct = encrypted_data[16:]
-    cipher = AES.new(aes_key, AES.MODE_CBC, iv)
-    pt = unpad(cipher.decrypt(ct), AES.block_size)
-    return json.loads(pt.decode('utf-8'))
+    if mode == "gcm":
+        cipher = AES.new(aes_key, AES.MODE_GCM, nonce=encrypted_data[:12])
+        cipher.update(b"response")
+        pt = cipher.decrypt_and_verify(encrypted_data[12:-16], encrypted_data[-16:])
+    else:
+        iv = encrypted_data[:16]
+        ct = encrypted_data[16:]
+        cipher = AES.new(aes_key, AES.MODE_CBC, iv)
+        pt = unpad(cipher.decrypt(ct), AES.block_size)
+    if compression == "zlib":
+        pt = zlib.decompress(pt[1:]) if pt[:1] == b"\x01" else pt[1:]
+    return ENCODINGS[encoding][1](pt)
 
-def test_api():
-    print("Testing API with Security...")
+def test_api(encoding="json", mode="cbc", compression="none"):
+    print(f"Testing API with Security ({encoding} payloads, {mode}, compression {compression})...")
     
     # 1. Get Public Key
     print("1. Fetching Public Key...")
@@ -51,26 +86,31 @@ def test_api():
     aes_key = get_random_bytes(32) # 256-bit key
     
     cipher_rsa = PKCS1_v1_5.new(public_key)
-    enc_key = cipher_rsa.encrypt(aes_key)
+    # the server expects the base64 of the key, as the web client sends it
+    enc_key = cipher_rsa.encrypt(base64.b64encode(aes_key))
     enc_key_b64 = base64.b64encode(enc_key).decode('utf-8')
     
-    resp = requests.post(f"{BASE_URL}/handshake", json={"encrypted_key": enc_key_b64}, verify=False)
+    resp = requests.post(f"{BASE_URL}/handshake", json={"encrypted_key": enc_key_b64, "encodings": [encoding], "ciphers": [mode], "compression": [compression]}, verify=False)
     if resp.status_code != 200:
         print(f"Handshake failed: {resp.text}")
         return
     session_id = resp.json()["session_id"]
-    print(f"   Handshake successful. Session ID: {session_id}")
+    # the server falls back to json when it does not support the encoding
+    encoding = resp.json().get("encoding", "json")
+    mode = resp.json().get("cipher", "cbc")
+    compression = resp.json().get("compression", "none")
+    print(f"   Handshake successful. Session ID: {session_id}, encoding: {encoding}, cipher: {mode}, compression: {compression}")
     
     headers = {"X-Session-ID": session_id}
 
     # 3. Register
     print("3. Registering User...")
     payload = {"username": "testuser_sec", "password": "password123"}
-    encrypted_payload = encrypt_data(payload, aes_key)
+    encrypted_payload = encrypt_data(payload, aes_key, encoding, mode, compression)
     
     resp = requests.post(f"{BASE_URL}/register", json={"data": encrypted_payload}, headers=headers, verify=False)
     if resp.status_code == 200:
-        data = decrypt_data(resp.json()["data"], aes_key)
+        data = decrypt_data(resp.json()["data"], aes_key, encoding, mode, compression)
         print(f"   Register success: {data}")
     elif resp.status_code == 400: # Already exists
         print("   User already exists (expected if re-running)")
@@ -80,11 +120,11 @@ def test_api():
     # 4. Login
     print("4. Logging in...")
     payload = {"username": "testuser_sec", "password": "password123"}
-    encrypted_payload = encrypt_data(payload, aes_key)
+    encrypted_payload = encrypt_data(payload, aes_key, encoding, mode, compression)
     
     resp = requests.post(f"{BASE_URL}/login", json={"data": encrypted_payload}, headers=headers, verify=False)
     if resp.status_code == 200:
-        data = decrypt_data(resp.json()["data"], aes_key)
+        data = decrypt_data(resp.json()["data"], aes_key, encoding, mode, compression)
         print(f"   Login success: {data}")
     else:
         print(f"   Login failed: {resp.text}")
@@ -100,11 +140,11 @@ def test_api():
         "min_price": 100,
         "time_remaining": 60
     }
-    encrypted_payload = encrypt_data(payload, aes_key)
+    encrypted_payload = encrypt_data(payload, aes_key, encoding, mode, compression)
     
     resp = requests.post(f"{BASE_URL}/auction", json={"data": encrypted_payload}, headers=headers, verify=False)
     if resp.status_code == 200:
-        data = decrypt_data(resp.json()["data"], aes_key)
+        data = decrypt_data(resp.json()["data"], aes_key, encoding, mode, compression)
         print(f"   Create Auction success: {data}")
     else:
         print(f"   Create Auction failed: {resp.text}")
@@ -113,10 +153,11 @@ def test_api():
     print("6. Listing Auctions...")
     resp = requests.get(f"{BASE_URL}/auctions", headers=headers, verify=False)
     if resp.status_code == 200:
-        data = decrypt_data(resp.json()["data"], aes_key)
+        data = decrypt_data(resp.json()["data"], aes_key, encoding, mode, compression)
         print(f"   Auctions found: {len(data)}")
     else:
         print(f"   List Auctions failed: {resp.text}")
 
 if __name__ == "__main__":
-    test_api()
+    # usage: python test_api.py [json|msgpack|cbor] [cbc|gcm] [none|zlib]
+    test_api(*sys.argv[1:4])
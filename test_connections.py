@@ -0,0 +1,40 @@
+import asyncio
+
+from connections import ALL, Connection, ConnectionManager
+
+def bound_connection(manager: ConnectionManager) -> Connection:
+    conn = Connection(object(), manager.queue_size, manager.coalesce_window, "session")
+    manager.active_connections[conn.websocket] = conn
+    manager._add(conn, ALL)
+    return conn
+
+def test_key_is_not_overtaken_by_coalesced_event():
+    async def run():
+        epoch = [1]
+        manager = ConnectionManager(coalesce_window=0.01, seal=lambda payload: f"{epoch[0]}:{payload}")
+        conn = bound_connection(manager)
+
+        manager.broadcast("a1", {"event": "NEW_BID", "amount": 1}, coalesce=True)
+        manager.send(conn.websocket, "KEY 2")
+        epoch[0] = 2
+        manager.broadcast("a1", {"event": "NEW_BID", "amount": 2}, coalesce=True)
+        # a bid merged into the slot ahead of the key would leave only two messages
+        return [await asyncio.wait_for(conn.queue.get(), 1) for _ in range(3)]
+
+    first, key, last = asyncio.run(run())
+    assert first.startswith("1:") and '"amount": 1' in first
+    assert key == "KEY 2"
+    assert last.startswith("2:") and '"amount": 2' in last
+
+def test_bids_still_coalesce_between_barriers():
+    async def run():
+        manager = ConnectionManager(coalesce_window=0.01)
+        conn = bound_connection(manager)
+        for amount in (1, 2, 3):
+            manager.broadcast("a1", {"event": "NEW_BID", "amount": amount}, coalesce=True)
+        messages = [await asyncio.wait_for(conn.queue.get(), 1)]
+        return messages, len(conn.queue)
+
+    messages, left = asyncio.run(run())
+    assert '"amount": 3' in messages[0]
+    assert left == 0
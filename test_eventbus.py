@@ -0,0 +1,38 @@
+import asyncio
+
+from connections import ConnectionManager
+from eventbus import MAX_FRAME, EventBroker, EventBus
+
+class Recorder(ConnectionManager):
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def broadcast(self, topic, message, coalesce=False):
+        self.seen.append(message)
+
+def test_oversized_frame_is_dropped_without_losing_the_link(tmp_path):
+    async def run():
+        path = str(tmp_path / "events.sock")
+        broker = asyncio.create_task(EventBroker(path).serve())
+        while not (tmp_path / "events.sock").exists():
+            await asyncio.sleep(0.01)
+        sender, receiver = EventBus(Recorder(), path), EventBus(Recorder(), path)
+        await sender.start()
+        await receiver.start()
+        try:
+            sender.publish("a1", {"event": "CREAT", "description": "x" * MAX_FRAME})
+            sender.publish("a1", {"event": "NEW_BID", "amount": 2})
+            for _ in range(100):
+                if receiver.manager.seen:
+                    break
+                await asyncio.sleep(0.01)
+            return sender.stats(), receiver.manager.seen
+        finally:
+            await sender.close()
+            await receiver.close()
+            broker.cancel()
+
+    stats, seen = asyncio.run(run())
+    assert stats["dropped"] == 1 and stats["connected"]
+    assert seen == [{"event": "NEW_BID", "amount": 2}]
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+from scheduler import ExpiryScheduler
+
+def test_failed_expiry_is_retried():
+    async def run():
+        attempts = []
+        closed = asyncio.Event()
+
+        async def on_expire(auction_id: str):
+            attempts.append(auction_id)
+            if len(attempts) < 3:
+                raise OSError("fsync failed")
+            closed.set()
+
+        scheduler = ExpiryScheduler(on_expire)
+        scheduler.retry_delay = 0.01
+        scheduler.schedule("a1", time.time())
+        task = asyncio.create_task(scheduler.run())
+        try:
+            await asyncio.wait_for(closed.wait(), 1)
+        finally:
+            task.cancel()
+        return attempts, scheduler
+
+    attempts, scheduler = asyncio.run(run())
+    assert attempts == ["a1"] * 3
+    assert len(scheduler) == 0
+    assert not scheduler._failures
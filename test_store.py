@@ -0,0 +1,266 @@
+import json
+import threading
+import time
+
+import pytest
+
+from store import AuctionStore, NotFound, Rejected, SqliteAuctionStore
+
+def new_auction(auction_id: str) -> dict:
+    # as main.new_auction_record builds it
+    now = time.time()
+    return {"id": auction_id, "item": "lamp", "seller": "bob", "start_time": now, "end_time": now + 3600,
+            "status": "open", "highest_bid": 10, "highest_bidder": None}
+
+def open_store(tmp_path, **kwargs) -> AuctionStore:
+    # compaction only when a test asks for it
+    kwargs.setdefault("compact_every", 10**6)
+    kwargs.setdefault("compact_interval", 3600)
+    return AuctionStore(str(tmp_path / "data.json"), **kwargs)
+
+def test_journal_is_replayed(tmp_path):
+    store = open_store(tmp_path)
+    store.create_auction(new_auction("a1")).result(timeout=5)
+    store.place_bid("a1", "al", 20).result(timeout=5)
+    store.add_user({"username": "al", "password": "x"}).result(timeout=5)
+    # left running as if the process died: nothing compacted, no snapshot yet
+    assert not (tmp_path / "data.json").exists()
+
+    recovered = open_store(tmp_path)
+    auction = recovered.get_auction("a1")
+    assert auction["highest_bid"] == 20 and auction["highest_bidder"] == "al"
+    assert recovered.find_user("al") is not None
+    assert recovered._seq == 3
+    recovered.close()
+
+def test_torn_tail_is_truncated(tmp_path):
+    store = open_store(tmp_path)
+    store.create_auction(new_auction("a1")).result(timeout=5)
+    store.place_bid("a1", "al", 20).result(timeout=5)
+    journal = tmp_path / "data.journal"
+    intact = journal.read_bytes()
+    with open(journal, "ab") as f:
+        f.write(b'{"op": "bid_accepted", "id": "a1", "bidder": "mo", "amou')
+
+    recovered = open_store(tmp_path)
+    assert recovered.get_auction("a1")["highest_bid"] == 20
+    assert journal.read_bytes() == intact
+    # later records are appended after the good ones
+    recovered.place_bid("a1", "mo", 30).result(timeout=5)
+    recovered.close()
+
+    again = open_store(tmp_path)
+    assert again.get_auction("a1")["highest_bidder"] == "mo"
+    again.close()
+
+def test_recovery_across_compaction(tmp_path):
+    store = open_store(tmp_path, compact_every=2)
+    store.create_auction(new_auction("a1")).result(timeout=5)
+    store.place_bid("a1", "al", 20).result(timeout=5)
+    store.create_auction(new_auction("a2")).result(timeout=5)
+    store.place_bid("a2", "al", 15).result(timeout=5)
+    store.place_bid("a1", "mo", 25).result(timeout=5)
+    store.close()
+
+    snapshot = json.loads((tmp_path / "data.json").read_text())
+    assert snapshot["seq"] == 5
+    # a snapshot written before the crash, with the journal still holding
+    # records it already covers, must not apply them twice
+    stale = json.dumps({"op": "bid_accepted", "id": "a1", "bidder": "al", "amount": 20, "seq": 2})
+    (tmp_path / "data.journal").write_text(stale + "\n")
+
+    recovered = open_store(tmp_path)
+    assert recovered.get_auction("a1")["highest_bidder"] == "mo"
+    assert recovered.get_auction("a2")["highest_bid"] == 15
+    assert recovered._seq == 5
+    recovered.close()
+
+def test_users_do_not_advance_the_version(tmp_path):
+    store = open_store(tmp_path)
+    store.create_auction(new_auction("a1")).result(timeout=5)
+    version = store.version
+    store.add_user({"username": "al", "password": "x"}).result(timeout=5)
+    store.set_password("al", "y").result(timeout=5)
+    assert store.version == version
+    assert store.changes_since(version) == ([], version)
+    store.close()
+
+    recovered = open_store(tmp_path)
+    assert recovered.version == version
+    recovered.close()
+
+def test_legacy_countdowns_are_written_back(tmp_path):
+    legacy = {"id": "a1", "item": "lamp", "seller": "bob", "status": "open",
+              "highest_bid": 10, "highest_bidder": None, "time_remaining": 3600}
+    (tmp_path / "data.json").write_text(json.dumps({"users": [], "auctions": [legacy]}))
+
+    store = open_store(tmp_path)
+    end_time = store.get_auction("a1")["end_time"]
+    store.close()
+    snapshot = json.loads((tmp_path / "data.json").read_text())
+    assert "time_remaining" not in snapshot["auctions"][0]
+
+    recovered = open_store(tmp_path)
+    assert recovered.get_auction("a1")["end_time"] == end_time
+    recovered.close()
+
+class FlakyJournal:
+    """Journal file whose next writes fail, after writing `torn` bytes."""
+
+    def __init__(self, journal, failures: int, torn: int = 0):
+        self._journal = journal
+        self.failures = failures
+        self.torn = torn
+
+    def write(self, data: bytes) -> int:
+        if self.failures:
+            self.failures -= 1
+            self._journal.write(data[:self.torn])
+            raise OSError(28, "No space left on device")
+        return self._journal.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._journal, name)
+
+def test_torn_journal_write_is_retried(tmp_path):
+    store = open_store(tmp_path)
+    store.retry_delay = 0.01
+    store.create_auction(new_auction("a1")).result(timeout=5)
+    store._journal = FlakyJournal(store._journal, failures=2, torn=10)
+    store.place_bid("a1", "al", 20).result(timeout=5)
+    store.place_bid("a1", "mo", 30).result(timeout=5)
+
+    # as after a crash, without the compaction of close()
+    recovered = open_store(tmp_path)
+    auction = recovered.get_auction("a1")
+    assert auction["highest_bid"] == 30 and auction["highest_bidder"] == "mo"
+    assert recovered._seq == 3
+    recovered.close()
+
+def test_failed_journal_write_is_not_overtaken(tmp_path):
+    store = open_store(tmp_path)
+    store.retry_delay = 0.01
+    store._journal = FlakyJournal(store._journal, failures=1)
+    created = store.create_auction(new_auction("a1"))
+    bid = store.place_bid("a1", "al", 20)
+    assert bid.result(timeout=5)["highest_bid"] == 20
+    assert created.done()
+
+    recovered = open_store(tmp_path)
+    assert recovered.get_auction("a1")["highest_bidder"] == "al"
+    recovered.close()
+
+def test_snapshots_taken_during_bids_recover_the_same_state(tmp_path):
+    store = open_store(tmp_path, compact_every=7)
+    store.snapshot_chunk = 2
+    for i in range(10):
+        store.create_auction(new_auction(f"a{i}")).result(timeout=5)
+    futures = [store.place_bid(f"a{n % 10}", f"u{n}", 11 + n) for n in range(200)]
+    for fut in futures:
+        fut.result(timeout=5)
+    live = [store.get_auction(f"a{i}") for i in range(10)]
+
+    recovered = open_store(tmp_path)
+    for auction in live:
+        got = recovered.get_auction(auction["id"])
+        assert (got["highest_bid"], got["highest_bidder"], got["version"]) == \
+               (auction["highest_bid"], auction["highest_bidder"], auction["version"])
+    recovered.close()
+
+#SqliteAuctionStore
+
+def test_sqlite_bid_race_accepts_each_amount_once(tmp_path):
+    # two stores on one file, as two workers
+    path = str(tmp_path / "data.db")
+    workers = [SqliteAuctionStore(path), SqliteAuctionStore(path)]
+    workers[0].create_auction(new_auction("a1")).result(timeout=5)
+    accepted, rejected = [], []
+
+    def bid(store, bidder):
+        for amount in range(11, 41):
+            try:
+                store.place_bid("a1", bidder, amount).result(timeout=30)
+                accepted.append(amount)
+            except Rejected:
+                rejected.append(amount)
+
+    threads = [threading.Thread(target=bid, args=(workers[n % 2], f"u{n}")) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(accepted) == sorted(set(accepted))
+    assert len(accepted) + len(rejected) == 6 * 30
+    assert max(accepted) == 40
+    auction = workers[1].get_auction("a1")
+    assert auction["highest_bid"] == 40
+    # one version per creation and per accepted bid, shared by both workers
+    assert workers[0].version == workers[1].version == 1 + len(accepted)
+    for store in workers:
+        store.close()
+
+def test_sqlite_close_race_succeeds_once(tmp_path):
+    path = str(tmp_path / "data.db")
+    workers = [SqliteAuctionStore(path), SqliteAuctionStore(path)]
+    workers[0].create_auction(new_auction("a1")).result(timeout=5)
+    futures = [store.close_auction("a1") for store in workers]
+    outcomes = [fut.exception(timeout=5) for fut in futures]
+    assert sum(e is None for e in outcomes) == 1
+    assert any(isinstance(e, Rejected) for e in outcomes)
+    for store in workers:
+        store.close()
+
+def test_sqlite_migrates_data_json_and_journal(tmp_path):
+    legacy = open_store(tmp_path, compact_every=2)
+    legacy.create_auction(new_auction("a1")).result(timeout=5)
+    legacy.place_bid("a1", "al", 20).result(timeout=5)
+    legacy.add_user({"username": "al", "password": "x"}).result(timeout=5)
+    # the last two records are only in the journal
+    legacy.create_auction(new_auction("a2")).result(timeout=5)
+    legacy.place_bid("a2", "mo", 15).result(timeout=5)
+    version = legacy.version
+    assert (tmp_path / "data.journal").stat().st_size
+
+    path = str(tmp_path / "data.db")
+    store = SqliteAuctionStore(path, migrate_from=str(tmp_path / "data.json"))
+    assert store.get_auction("a1")["highest_bidder"] == "al"
+    assert store.get_auction("a2")["highest_bid"] == 15
+    assert store.find_user("al")["password"] == "x"
+    assert store.version == version
+    assert [a["id"] for a in store.list_auctions()[0]] == ["a1", "a2"]
+    store.place_bid("a1", "mo", 30).result(timeout=5)
+    store.close()
+
+    # only an empty database is filled
+    again = SqliteAuctionStore(path, migrate_from=str(tmp_path / "data.json"))
+    assert again.get_auction("a1")["highest_bidder"] == "mo"
+    assert len(again.list_auctions()[0]) == 2
+    again.close()
+
+def test_sqlite_rejected_operations_do_not_roll_back_the_others(tmp_path):
+    path = str(tmp_path / "data.db")
+    store = SqliteAuctionStore(path)
+    store.create_auction(new_auction("a1")).result(timeout=5)
+    outcomes = store.batch([
+        ("bid", "a1", "al", 20),
+        ("bid", "a1", "mo", 15),
+        ("create", new_auction("a1")),
+        ("create", new_auction("a2")),
+        ("get", "nope"),
+    ]).result(timeout=5)
+    assert outcomes[0]["highest_bid"] == 20
+    assert isinstance(outcomes[1], Rejected) and isinstance(outcomes[2], Rejected)
+    assert outcomes[3]["id"] == "a2"
+    assert isinstance(outcomes[4], NotFound)
+
+    # operations queued together share one transaction
+    futures = [store.place_bid("a1", "al", 30), store.place_bid("a1", "mo", 25), store.place_bid("a2", "mo", 40)]
+    with pytest.raises(Rejected):
+        futures[1].result(timeout=5)
+    store.close()
+
+    reopened = SqliteAuctionStore(path)
+    assert reopened.get_auction("a1")["highest_bid"] == 30
+    assert reopened.get_auction("a2")["highest_bid"] == 40
+    reopened.close()